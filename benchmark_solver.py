@@ -0,0 +1,50 @@
+"""
+Benchmark of the endgame solver: solve time and nodes versus the number of empty cells.
+
+Positions come from random games (stopped before they are over) on the standard
+board, and each is solved from scratch with a fresh table, the way the first
+endgame move of a game is.
+
+    python benchmark_solver.py --empties 8 10 12 14 16 --positions 20
+"""
+
+import argparse
+import random
+import statistics
+import time
+from types import SimpleNamespace
+from bitboard import Position
+from solver import Solver
+
+# Random position with `empties` empty cells where the game is not over
+def random_position(config, empties, rng):
+    while True:
+        position = Position(config)
+        while position.rows*position.columns - position.count > empties and not position.is_terminal():
+            position.play(rng.choice(position.valid_moves()))
+        if not position.is_terminal():
+            return position
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--empties', type=int, nargs='+', default=[6, 8, 10, 12, 14, 16])
+    parser.add_argument('--positions', type=int, default=20, help="positions per empty count")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    config = SimpleNamespace(rows=6, columns=7, inarow=4)
+    rng = random.Random(args.seed)
+    print("{:>7} {:>10} {:>10} {:>10} {:>12}".format("empties", "mean ms", "median ms", "max ms", "mean nodes"))
+    for empties in args.empties:
+        times, nodes = [], []
+        for _ in range(args.positions):
+            position = random_position(config, empties, rng)
+            solver = Solver(config)
+            start = time.perf_counter()
+            solver.score_moves(position)
+            times.append(1000 * (time.perf_counter() - start))
+            nodes.append(solver.nodes)
+        print("{:>7} {:>10.1f} {:>10.1f} {:>10.1f} {:>12.0f}".format(
+            empties, statistics.mean(times), statistics.median(times), max(times), statistics.mean(nodes)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""
+Bitboard representation of a Connect X position, shared by the minimax agents.
+
+Each player's discs are kept in one integer with (rows+1) bits per column, filled
+from the bottom of the column upwards; the extra bit on top of every column is a
+sentinel that is never set, so shifted runs cannot wrap from one column into the
+next. Dropping and taking back a disc only touches the column height and one bit,
+and a win is found with a handful of shift-and-mask operations.
+
+A flat row-major copy of the board (same layout as obs.board) is kept in sync so
+the grid based heuristics can read the position without rebuilding it, as is a
+Zobrist hash of the discs for the transposition tables.
+
+A position and its left-right mirror image are worth the same, so the caches key on
+the canonical form: the smaller of the key (or hash) of the position and of its
+mirror image. The hash of the mirror image is kept up to date alongside the hash.
+"""
+
+import random
+import numpy as np
+
+_ZOBRIST = {}
+
+# Random 64-bit keys per mark and bit, the same for every position of a board size
+def zobrist_keys(config):
+    size = (config.rows, config.columns)
+    if size not in _ZOBRIST:
+        rng = random.Random('zobrist-{}x{}'.format(*size))
+        bits = config.columns * (config.rows+1)
+        _ZOBRIST[size] = [None] + [[rng.getrandbits(64) for _ in range(bits)] for _ in range(2)]
+    return _ZOBRIST[size]
+
+class Position:
+
+    def __init__(self, config):
+        self.rows = config.rows
+        self.columns = config.columns
+        self.inarow = config.inarow
+        # Bits per column, including the sentinel bit
+        self.stride = config.rows + 1
+        # Shifts for vertical, horizontal and both diagonal directions
+        self.directions = (1, self.stride, self.stride - 1, self.stride + 1)
+        # Bits of every cell of the board (sentinels excluded), and of the bottom cells
+        self.board_mask = sum(((1 << config.rows) - 1) << (col*self.stride) for col in range(config.columns))
+        self.bottom_mask = sum(1 << (col*self.stride) for col in range(config.columns))
+        # Discs of each player, indexed by mark (slot 0 is unused)
+        self.boards = [0, 0, 0]
+        # Number of discs in each column
+        self.heights = [0] * config.columns
+        # Flat copy of the board, row 0 being the top row like obs.board
+        self.cells = np.zeros(config.rows * config.columns, dtype=np.int8)
+        # Columns played since the position was created, used to undo moves
+        self.moves = []
+        self.count = 0
+        # Mark of the player to move
+        self.mark = 1
+        # Zobrist hash of the discs on the board, and of the board mirrored left-right
+        self.zobrist = zobrist_keys(config)
+        self.hash = 0
+        self.mirror_hash = 0
+        # Optional windows.IncrementalWindows kept in sync with the discs
+        self.windows = None
+
+    # Builds a position from a Kaggle observation board with `mark` to move
+    @classmethod
+    def from_board(cls, board, mark, config):
+        position = cls(config)
+        for row in range(config.rows-1, -1, -1):
+            for col in range(config.columns):
+                piece = board[row*config.columns + col]
+                if piece:
+                    position.place(col, piece)
+        position.mark = mark
+        return position
+
+    # Bit index of the lowest empty cell in the selected column
+    def top_index(self, col):
+        return col*self.stride + self.heights[col]
+
+    # Bit index of the same cell in the mirror image, for bit `index` of column col
+    def mirror_index(self, index, col):
+        return index + (self.columns-1-2*col)*self.stride
+
+    # Index into `cells` of the lowest empty cell in the selected column
+    def top_cell(self, col):
+        return (self.rows-1-self.heights[col])*self.columns + col
+
+    # Drops a disc of the given mark without changing the player to move
+    def place(self, col, mark):
+        index = self.top_index(col)
+        self.boards[mark] |= 1 << index
+        self.hash ^= self.zobrist[mark][index]
+        self.mirror_hash ^= self.zobrist[mark][self.mirror_index(index, col)]
+        self.cells[self.top_cell(col)] = mark
+        if self.windows is not None:
+            self.windows.place(index, mark)
+        self.heights[col] += 1
+        self.count += 1
+
+    def can_play(self, col):
+        return self.heights[col] < self.rows
+
+    def valid_moves(self):
+        return [c for c in range(self.columns) if self.heights[c] < self.rows]
+
+    # Drops a disc for the player to move and passes the turn
+    def play(self, col):
+        self.place(col, self.mark)
+        self.moves.append(col)
+        self.mark = 3 - self.mark
+
+    # Takes back the last move made with play()
+    def undo(self):
+        col = self.moves.pop()
+        self.mark = 3 - self.mark
+        self.heights[col] -= 1
+        self.count -= 1
+        index = self.top_index(col)
+        self.boards[self.mark] ^= 1 << index
+        self.hash ^= self.zobrist[self.mark][index]
+        self.mirror_hash ^= self.zobrist[self.mark][self.mirror_index(index, col)]
+        self.cells[self.top_cell(col)] = 0
+        if self.windows is not None:
+            self.windows.remove(index, self.mark)
+
+    # Checks if the given mark has config.inarow discs in a line
+    def is_win(self, mark):
+        bitboard = self.boards[mark]
+        for shift in self.directions:
+            run = bitboard
+            for _ in range(self.inarow-1):
+                run &= run >> shift
+            if run:
+                return True
+        return False
+
+    def is_full(self):
+        return self.count == self.rows * self.columns
+
+    # Checks if the game has ended: only the player who moved last can have won
+    def is_terminal(self):
+        return self.is_full() or self.is_win(3 - self.mark)
+
+    # Unique key of the position: the discs of the player to move plus all discs plus
+    # the bottom row, which marks the lowest empty cell of every column with one bit
+    def key(self):
+        return self.boards[self.mark] + (self.boards[1] | self.boards[2]) + self.bottom_mask
+
+    # Column col seen in the mirror image
+    def mirror_move(self, col):
+        return self.columns-1-col
+
+    # Mirror image of a bitboard in this layout: column c becomes column columns-1-c
+    def mirror(self, bitboard):
+        column = (1 << self.stride) - 1
+        mirrored = 0
+        for col in range(self.columns):
+            mirrored |= ((bitboard >> (col*self.stride)) & column) << ((self.columns-1-col)*self.stride)
+        return mirrored
+
+    # Canonical key(): the smaller of the keys of the position and of its mirror
+    # image, and whether it is the mirror image's
+    def canonical_key(self):
+        key = self.key()
+        mirrored = self.mirror(key)
+        return (mirrored, True) if mirrored < key else (key, False)
+
+    # Canonical Zobrist hash, the same way
+    def canonical_hash(self):
+        if self.mirror_hash < self.hash:
+            return self.mirror_hash, True
+        return self.hash, False
+
+    # 2D view of the board for the heuristics (no copy)
+    def grid(self):
+        return self.cells.reshape(self.rows, self.columns)
+
+    # Stack of flat boards, one per column in `moves`, after the player to move plays it
+    def children_cells(self, moves):
+        boards = np.repeat(self.cells[None], len(moves), axis=0)
+        boards[np.arange(len(moves)), [self.top_cell(c) for c in moves]] = self.mark
+        return boards
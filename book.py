@@ -0,0 +1,72 @@
+"""
+Opening book read at runtime by the minimax agents.
+
+The book is a sorted binary file written offline by build_book.py:
+
+    header  16 bytes: magic b'CXBOOK1\\0', rows, columns, inarow, 1 pad byte, count (uint32)
+    keys    count x uint64, sorted, canonical position keys
+    moves   count x uint8, best column in the canonical orientation
+    scores  count x int8, solver score for the player to move
+
+A position and its left-right mirror image have the same value, so only the
+canonical key (Position.canonical_key) is stored. The arrays are memory-mapped, so opening the book
+costs nothing and a lookup is one binary search touching a few pages.
+"""
+
+import os
+import struct
+import numpy as np
+
+MAGIC = b'CXBOOK1\0'
+HEADER = struct.Struct('<8sBBBxI')
+
+# Book shipped next to the agents (the agents search normally when it is missing)
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'opening_book.bin')
+
+class OpeningBook:
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            magic, self.rows, self.columns, self.inarow, count = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError("Not an opening book: {}".format(path))
+        offset = HEADER.size
+        self.keys = np.memmap(path, dtype='<u8', mode='r', offset=offset, shape=(count,))
+        self.moves = np.memmap(path, dtype='u1', mode='r', offset=offset + 8*count, shape=(count,))
+        self.scores = np.memmap(path, dtype='i1', mode='r', offset=offset + 9*count, shape=(count,))
+
+    def __len__(self):
+        return len(self.keys)
+
+    # (best column, score) for the player to move, or None when the position is not in the book
+    def lookup(self, position):
+        if (position.rows, position.columns, position.inarow) != (self.rows, self.columns, self.inarow):
+            return None
+        key, mirrored = position.canonical_key()
+        i = int(np.searchsorted(self.keys, np.uint64(key)))
+        if i == len(self.keys) or int(self.keys[i]) != key:
+            return None
+        move = int(self.moves[i])
+        if mirrored:
+            move = position.mirror_move(move)
+        return move, int(self.scores[i])
+
+    # Writes a book from {canonical key: (move, score)}
+    @staticmethod
+    def write(path, entries, config):
+        keys = np.array(sorted(entries), dtype='<u8')
+        moves = np.array([entries[key][0] for key in keys.tolist()], dtype='u1')
+        scores = np.array([entries[key][1] for key in keys.tolist()], dtype='i1')
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, config.rows, config.columns, config.inarow, len(keys)))
+            f.write(keys.tobytes())
+            f.write(moves.tobytes())
+            f.write(scores.tobytes())
+
+_BOOKS = {}
+
+# The book at path, opened once per process, or None if there is no such file
+def load_book(path=BOOK_PATH):
+    if path not in _BOOKS:
+        _BOOKS[path] = OpeningBook(path) if os.path.exists(path) else None
+    return _BOOKS[path]
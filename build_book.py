@@ -0,0 +1,107 @@
+"""
+Builds the opening book read by book.py.
+
+Every position reachable in up to --plies moves (mirror images folded together) is
+sent to an external perfect-play solver, and the best move and score for the player
+to move are written to a sorted binary file. The solver is any program speaking the
+protocol of Pascal Pons' connect4 solver run with `-a`: it reads one position per
+line as the 1-based columns played, and answers with the same line followed by the
+score of every column (scores below -100 mark full columns).
+
+    python build_book.py --solver "./c4solver -a" --plies 12 --output opening_book.bin
+
+The solver only has to be available where the book is built; the agents just read
+the file.
+"""
+
+import argparse
+import shlex
+import subprocess
+import sys
+from types import SimpleNamespace
+from bitboard import Position
+from book import OpeningBook
+
+# Talks to an external solver process, one position at a time
+class ExternalSolver:
+
+    def __init__(self, command):
+        self.process = subprocess.Popen(shlex.split(command), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        universal_newlines=True, bufsize=1)
+
+    # Score of every column for the player to move after `moves`, None for full columns
+    def analyze(self, moves):
+        line = ''.join(str(col+1) for col in moves)
+        self.process.stdin.write(line + '\n')
+        self.process.stdin.flush()
+        answer = self.process.stdout.readline().split()
+        if not answer:
+            raise RuntimeError("Solver stopped answering at position '{}'".format(line))
+        if line:
+            answer = answer[1:]
+        return [int(score) if int(score) > -100 else None for score in answer]
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+# Move sequence leading to one representative of every position (up to mirror image)
+# reachable in at most `plies` moves without the game ending
+def enumerate_positions(config, plies):
+    position = Position(config)
+    frontier = {position.canonical_key()[0]: []}
+    for ply in range(plies+1):
+        yield from frontier.values()
+        if ply == plies:
+            break
+        children = {}
+        for moves in frontier.values():
+            for col in moves:
+                position.play(col)
+            for col in position.valid_moves():
+                position.play(col)
+                if not position.is_terminal():
+                    children.setdefault(position.canonical_key()[0], moves + [col])
+                position.undo()
+            while position.moves:
+                position.undo()
+        frontier = children
+
+def build_book(config, plies, solver, output, progress=10000):
+    position = Position(config)
+    entries = {}
+    for count, moves in enumerate(enumerate_positions(config, plies), 1):
+        scores = solver.analyze(moves)
+        best = max((col for col, score in enumerate(scores) if score is not None), key=lambda col: scores[col])
+        for col in moves:
+            position.play(col)
+        key, mirrored = position.canonical_key()
+        while position.moves:
+            position.undo()
+        entries[key] = (position.mirror_move(best) if mirrored else best, scores[best])
+        if progress and count % progress == 0:
+            print("{} positions solved".format(count), file=sys.stderr)
+    OpeningBook.write(output, entries, config)
+    return len(entries)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--solver', required=True, help="solver command line, e.g. './c4solver -a'")
+    parser.add_argument('--plies', type=int, default=12, help="deepest ply stored in the book")
+    parser.add_argument('--output', default='opening_book.bin')
+    parser.add_argument('--rows', type=int, default=6)
+    parser.add_argument('--columns', type=int, default=7)
+    parser.add_argument('--inarow', type=int, default=4)
+    args = parser.parse_args()
+    config = SimpleNamespace(rows=args.rows, columns=args.columns, inarow=args.inarow)
+    if args.columns * (args.rows+1) > 64:
+        parser.error("book keys are 64-bit, the board is too large")
+    solver = ExternalSolver(args.solver)
+    try:
+        count = build_book(config, args.plies, solver, args.output)
+    finally:
+        solver.close()
+    print("Wrote {} positions to {}".format(count, args.output))
+
+if __name__ == '__main__':
+    main()
@@ -2,149 +2,13 @@
 Your submission should be a python file with the last 'def' accepting an observation and returning an action. You can also upload multiple files in a zip/gz/7z archive with a main.py at the top level.
 """
 
-import random
-import numpy as np
+from engine import Engine, Term
 
-# Gets board at next step if agent drops piece in selected column
-def drop_piece(grid, col, mark, config):
-    next_grid = grid.copy()
-    for row in range(config.rows-1, -1, -1):
-        if next_grid[row][col] == 0:
-            break
-    next_grid[row][col] = mark
-    return next_grid
+# Heuristic: good spots for 3 to config.inarow discs, the opponent's weighing 100 times more
+def heuristic(inarow):
+    return [Term("spots", num, 100**i, -100 * 100**i) for i,num in enumerate(range(3, inarow+1))]
 
-# Helper function for get_heuristic: checks if window satisfies heuristic conditions
-def check_window(window, num_discs, piece, config):
-    return (window.count(piece) == num_discs and window.count(0) == config.inarow-num_discs)
-    
-# Helper function for get_heuristic: counts number of windows satisfying specified heuristic conditions
-def find_spots(grid, num_discs, piece, config):
-    good_spots = []
-    # horizontal
-    for row in range(config.rows):
-        for col in range(config.columns-(config.inarow-1)):
-            window = list(grid[row, col:col+config.inarow])
-            if check_window(window, num_discs, piece, config):
-                for i,spot in enumerate(window):
-                    r,c = row,col+i
-                    assert grid[r,c] == spot
-                    if (r,c) not in good_spots and spot == 0:
-                        good_spots.append((r,c))
-    # vertical
-    for row in range(config.rows-(config.inarow-1)):
-        for col in range(config.columns):
-            window = list(grid[row:row+config.inarow, col])
-            if check_window(window, num_discs, piece, config):
-                for i,spot in enumerate(window):
-                    r,c = row+i,col
-                    assert grid[r,c] == spot
-                    if (r,c) not in good_spots and spot == 0:
-                        good_spots.append((r,c))
-    # positive diagonal
-    for row in range(config.rows-(config.inarow-1)):
-        for col in range(config.columns-(config.inarow-1)):
-            window = list(grid[range(row, row+config.inarow), range(col, col+config.inarow)])
-            if check_window(window, num_discs, piece, config):
-                for i,spot in enumerate(window):
-                    r,c = row+i,col+i
-                    assert grid[r,c] == spot
-                    if (r,c) not in good_spots and spot == 0:
-                        good_spots.append((r,c))
-    # negative diagonal
-    for row in range(config.inarow-1, config.rows):
-        for col in range(config.columns-(config.inarow-1)):
-            window = list(grid[range(row, row-config.inarow, -1), range(col, col+config.inarow)])
-            if check_window(window, num_discs, piece, config):
-                for i,spot in enumerate(window):
-                    r,c = row-i,col+i
-                    assert grid[r,c] == spot
-                    if (r,c) not in good_spots and spot == 0:
-                        good_spots.append((r,c))
-    return good_spots
-
-# Helper function for minimax: calculates value of heuristic for grid
-def get_heuristic(grid, mark, config):
-    score = 0
-    for i,num in enumerate(range(3, config.inarow+1)):
-        weight = 100**i
-        good_spots = find_spots(grid, num, mark, config)
-        good_spots_opp = find_spots(grid, num, mark%2+1, config)
-        score += weight * len(good_spots) - 100 * weight * len(good_spots_opp) 
-    return score
-
-# Uses minimax to calculate value of dropping piece in selected column
-def score_move(grid, col, mark, config, nsteps):
-    next_grid = drop_piece(grid, col, mark, config)
-    score = minimax(next_grid, nsteps-1, False, mark, config)
-    return score
-
-# Helper function for minimax: checks if agent or opponent has four in a row in the window
-def is_terminal_window(window, config):
-    return window.count(1) == config.inarow or window.count(2) == config.inarow
-
-# Helper function for minimax: checks if game has ended
-def is_terminal_node(grid, config):
-    # Check for draw 
-    if list(grid[0, :]).count(0) == 0:
-        return True
-    # Check for win: horizontal, vertical, or diagonal
-    # horizontal 
-    for row in range(config.rows):
-        for col in range(config.columns-(config.inarow-1)):
-            window = list(grid[row, col:col+config.inarow])
-            if is_terminal_window(window, config):
-                return True
-    # vertical
-    for row in range(config.rows-(config.inarow-1)):
-        for col in range(config.columns):
-            window = list(grid[row:row+config.inarow, col])
-            if is_terminal_window(window, config):
-                return True
-    # positive diagonal
-    for row in range(config.rows-(config.inarow-1)):
-        for col in range(config.columns-(config.inarow-1)):
-            window = list(grid[range(row, row+config.inarow), range(col, col+config.inarow)])
-            if is_terminal_window(window, config):
-                return True
-    # negative diagonal
-    for row in range(config.inarow-1, config.rows):
-        for col in range(config.columns-(config.inarow-1)):
-            window = list(grid[range(row, row-config.inarow, -1), range(col, col+config.inarow)])
-            if is_terminal_window(window, config):
-                return True
-    return False
-
-# Minimax implementation
-def minimax(node, depth, maximizingPlayer, mark, config):
-    is_terminal = is_terminal_node(node, config)
-    valid_moves = [c for c in range(config.columns) if node[0][c] == 0]
-    if depth == 0 or is_terminal:
-        return get_heuristic(node, mark, config)
-    if maximizingPlayer:
-        value = -np.Inf
-        for col in valid_moves:
-            child = drop_piece(node, col, mark, config)
-            value = max(value, minimax(child, depth-1, False, mark, config))
-        return value
-    else:
-        value = np.Inf
-        for col in valid_moves:
-            child = drop_piece(node, col, mark%2+1, config)
-            value = min(value, minimax(child, depth-1, True, mark, config))
-        return value
-    
-# How deep to make the game tree: higher values take longer to run!
-N_STEPS = 3
+ENGINE = Engine(heuristic)
 
 def agent(obs, config):
-    # Get list of valid moves
-    valid_moves = [c for c in range(config.columns) if obs.board[c] == 0]
-    # Convert the board to a 2D grid
-    grid = np.asarray(obs.board).reshape(config.rows, config.columns)
-    # Use the heuristic to assign a score to each possible board in the next step
-    scores = dict(zip(valid_moves, [score_move(grid, col, obs.mark, config, N_STEPS) for col in valid_moves]))
-    # Get a list of columns (moves) that maximize the heuristic
-    max_cols = [key for key in scores.keys() if scores[key] == max(scores.values())]
-    # Select at random from the maximizing columns
-    return random.choice(max_cols)
\ No newline at end of file
+    return ENGINE.agent(obs, config)
@@ -0,0 +1,220 @@
+"""
+Search engine shared by the minimax agents.
+
+An agent is a heuristic spec plus a few options: the spec lists weighted terms over
+the window counts of windows.py, and the Engine runs the search (full-width minimax,
+fixed-depth alpha-beta or iterative deepening) with that heuristic. Everything the
+agents used to copy between their modules (evaluation wrappers, minimax, agent())
+lives here once.
+"""
+
+import random
+import time
+from collections import namedtuple
+import numpy as np
+from bitboard import Position
+from book import BOOK_PATH, load_book
+from parallel import RootPool, SMPPool
+from search import SearchStats, SearchTimeout, iterative_deepening, move_time, score_moves
+from solver import Solver
+from tactics import tactical_moves
+from transposition import TableStore
+from windows import IncrementalWindows, WindowStats
+
+# One term of a heuristic. `kind` is what is counted for num_discs discs:
+#   "windows" - windows holding num_discs discs of a mark and nothing else
+#   "spots"   - empty cells ("good spots") of those windows
+#   "stacked" - good spots lying directly on top of another good spot
+# The term adds weight times the count for the agent and opp_weight times the count
+# for the opponent (opp_weight is usually negative).
+Term = namedtuple('Term', 'kind num_discs weight opp_weight')
+
+# Heuristic from a spec: `terms(inarow)` returns the list of Terms for a board size
+class Heuristic:
+
+    def __init__(self, terms):
+        self.terms = terms
+        self.compiled = {}
+
+    # Value of the heuristic for mark, from WindowStats or IncrementalWindows counts
+    def __call__(self, windows, mark, inarow):
+        if inarow not in self.compiled:
+            self.compiled[inarow] = list(self.terms(inarow))
+        opp = mark%2+1
+        spots = {}
+        def good_spots(num, piece):
+            if (num, piece) not in spots:
+                spots[num, piece] = windows.spots(num, piece)
+            return spots[num, piece]
+        score = 0
+        for kind, num, weight, opp_weight in self.compiled[inarow]:
+            if kind == "windows":
+                own, other = windows.count(num, mark), windows.count(num, opp)
+            elif kind == "spots":
+                own, other = windows.size(good_spots(num, mark)), windows.size(good_spots(num, opp))
+            elif kind == "stacked":
+                own, other = windows.stacked(good_spots(num, mark)), windows.stacked(good_spots(num, opp))
+            else:
+                raise ValueError("Unknown heuristic term: {}".format(kind))
+            score += weight * own + opp_weight * other
+        return score
+
+class Engine:
+
+    def __init__(self, terms, search="iterative", evaluator="batch", n_steps=3, time_fraction=0.5, tables=None,
+                 tactics=True, book=BOOK_PATH, endgame=18, workers=0, parallel="root"):
+        self.terms = terms
+        self.heuristic = Heuristic(terms)
+        # Worker processes for the "iterative" search (0 or 1 searches in this process
+        # only). The pool starts on the first move and is kept for the following ones.
+        self.workers = workers
+        # How the workers share the search: "root" splits the root moves between them,
+        # "smp" has them all search the root next to this process with one shared
+        # transposition table (lazy SMP)
+        self.parallel = parallel
+        self.pool = None
+        # Solve the position exactly once at most this many cells are empty (0 never
+        # does), falling back to the heuristic search if the solver runs out of time
+        self.endgame = endgame
+        self.solver = self.solver_size = None
+        # Opening book file (see book.py), None to always search. A missing file is
+        # the same as no book.
+        self.book = book
+        # Play immediate wins and forced blocks without searching, and drop the root moves
+        # that let the opponent win on top of them
+        self.tactics = tactics
+        # "iterative" deepens alpha-beta until time_fraction of the move time is used,
+        # "alphabeta" searches n_steps deep (same scores as "minimax", fewer nodes)
+        # and "minimax" is the full-width search
+        self.search = search
+        # How alpha-beta evaluates leaves: "batch" scores the leaves of each frontier node
+        # in one NumPy call, "incremental" keeps window counts up to date on every move and
+        # reads them, "grid" recounts the windows of each leaf
+        self.evaluator = evaluator
+        # How deep to make the game tree for "alphabeta" and "minimax"
+        self.n_steps = n_steps
+        # Fraction of config.actTimeout (or config.timeout) spent by the "iterative" search
+        self.time_fraction = time_fraction
+        # Transposition tables for alpha-beta: size in entries, replacement policy ("depth"
+        # or "always") and whether to keep them between the turns of a game
+        self.tables = tables if tables is not None else TableStore(size=1 << 16, replacement="depth", persist=True)
+        # Node and cutoff counters of the last alpha-beta search
+        self.stats = SearchStats()
+
+    # Calculates value of heuristic for grid, or for each board of a stack of boards
+    def get_heuristic(self, grid, mark, config):
+        return self.heuristic(WindowStats(grid, config), mark, config.inarow)
+
+    # Heuristic for the position from the point of view of the player to move,
+    # read from the position's incremental window counts when it has them
+    def evaluate(self, mark, config):
+        def evaluate(position):
+            if position.windows is not None:
+                score = self.heuristic(position.windows, mark, config.inarow)
+            else:
+                score = self.get_heuristic(position.grid(), mark, config)
+            return score if position.mark == mark else -score
+        return evaluate
+
+    # Heuristic for all the children of a position in one batch, from the point
+    # of view of the player to move in the position
+    def evaluate_children(self, mark, config):
+        def evaluate_children(position, moves):
+            scores = self.get_heuristic(position.children_cells(moves), mark, config)
+            return scores if position.mark == mark else -scores
+        return evaluate_children
+
+    # Uses minimax to calculate value of dropping piece in selected column
+    def score_move(self, position, col, mark, config, nsteps):
+        position.play(col)
+        score = self.minimax(position, nsteps-1, False, mark, config)
+        position.undo()
+        return score
+
+    # Minimax implementation
+    def minimax(self, position, depth, maximizingPlayer, mark, config):
+        if depth == 0 or position.is_terminal():
+            return self.get_heuristic(position.grid(), mark, config)
+        valid_moves = position.valid_moves()
+        if maximizingPlayer:
+            value = -np.inf
+            for col in valid_moves:
+                position.play(col)
+                value = max(value, self.minimax(position, depth-1, False, mark, config))
+                position.undo()
+            return value
+        else:
+            value = np.inf
+            for col in valid_moves:
+                position.play(col)
+                value = min(value, self.minimax(position, depth-1, True, mark, config))
+                position.undo()
+            return value
+
+    # Scores of the moves (all valid moves by default) from the position, with position.mark to move
+    def score_moves(self, position, config, moves=None):
+        if self.search in ("iterative", "alphabeta"):
+            # Alpha-beta gives the exact score of the best moves and a lower score to the others
+            self.stats = SearchStats()
+            budget = self.time_fraction * move_time(config)
+            if self.search == "iterative" and self.workers > 1 and self.parallel == "root":
+                if self.pool is None:
+                    self.pool = RootPool(self.workers, self.terms, self.evaluator)
+                return self.pool.iterative_deepening(position, budget, moves, stats=self.stats)
+            evaluate = self.evaluate(position.mark, config)
+            evaluate_children = self.evaluate_children(position.mark, config) if self.evaluator == "batch" else None
+            if self.evaluator == "incremental":
+                IncrementalWindows(position)
+            if self.search == "iterative" and self.workers > 1 and self.parallel == "smp":
+                if self.pool is None:
+                    self.pool = SMPPool(self.workers, self.terms, self.evaluator)
+                return self.pool.iterative_deepening(position, budget, evaluate, evaluate_children, moves,
+                                                     stats=self.stats)
+            table = self.tables.get(position)
+            if self.search == "iterative":
+                return iterative_deepening(position, evaluate, budget, table=table, stats=self.stats,
+                                           evaluate_children=evaluate_children, moves=moves)
+            return score_moves(position, self.n_steps, evaluate, table, self.stats, evaluate_children, moves)
+        # Get list of valid moves
+        valid_moves = position.valid_moves() if moves is None else moves
+        # Use the heuristic to assign a score to each possible board in the next step
+        return dict(zip(valid_moves, [self.score_move(position, col, position.mark, config, self.n_steps) for col in valid_moves]))
+
+    # Exact scores of the moves from the endgame solver, or None if it ran out of time.
+    # It gets half the search time, so the fallback search still fits in the move time.
+    def solve_moves(self, position, config, moves=None):
+        size = (config.rows, config.columns, config.inarow)
+        if self.solver is None or self.solver_size != size:
+            self.solver, self.solver_size = Solver(config), size
+        self.solver.deadline = time.perf_counter() + self.time_fraction * move_time(config) / 2
+        played = len(position.moves)
+        try:
+            return self.solver.score_moves(position, moves)
+        except SearchTimeout:
+            while len(position.moves) > played:
+                position.undo()
+            return None
+
+    def agent(self, obs, config):
+        # Convert the board to a bitboard position with us to move
+        position = Position.from_board(obs.board, obs.mark, config)
+        moves = None
+        if self.tactics:
+            moves, forced = tactical_moves(position)
+            if forced:
+                return random.choice(moves)
+        # Play the book move while the position is in the opening book
+        book = load_book(self.book) if self.book is not None else None
+        if book is not None:
+            entry = book.lookup(position)
+            if entry is not None and (moves is None or entry[0] in moves):
+                return entry[0]
+        scores = None
+        if position.rows*position.columns - position.count <= self.endgame:
+            scores = self.solve_moves(position, config, moves)
+        if scores is None:
+            scores = self.score_moves(position, config, moves)
+        # Get a list of columns (moves) that maximize the heuristic
+        max_cols = [key for key in scores.keys() if scores[key] == max(scores.values())]
+        # Select at random from the maximizing columns
+        return random.choice(max_cols)
@@ -0,0 +1,87 @@
+"""
+Accuracy, size and speed of the submission for each weight storage type of
+export_submission.py, against the float32 network of weights.h5.
+
+    python benchmark_quantization.py --positions 2000
+
+The corpus is positions from random games. Agreement is the fraction of positions
+where the exported agent plays the same column as the float32 network (both over
+the legal columns only); max error is the largest difference of any Q value.
+"""
+
+import argparse
+import random
+import time
+import types
+from types import SimpleNamespace
+import numpy as np
+from export_submission import load_h5, render_submission
+
+# Board (in obs.board order) and mark of a position from a random game that is not full
+def random_position(rng, rows=6, columns=7):
+    board, heights, mark = [0] * (rows*columns), [0] * columns, 1
+    for _ in range(rng.randint(0, rows*columns - 1)):
+        col = rng.choice([c for c in range(columns) if heights[c] < rows])
+        board[(rows-1-heights[col])*columns + col] = mark
+        heights[col] += 1
+        mark = 3 - mark
+    return board, mark
+
+def forward(layers, inputs):
+    out = inputs
+    for kernel, bias in layers[:-1]:
+        out = np.maximum(0, out @ kernel + bias)
+    kernel, bias = layers[-1]
+    return np.tanh(out @ kernel + bias)
+
+# Q values of every position from the exported agent's layers, computed the way its my_agent does
+def exported_q(module, inputs):
+    out = inputs
+    for k, layer in enumerate(module.LAYERS):
+        if len(layer) == 3:
+            kernel, scale, bias = layer
+            out = (out @ kernel) * scale + bias
+        else:
+            kernel, bias = layer
+            out = out @ kernel + bias
+        out = np.maximum(0, out) if k < len(module.LAYERS) - 1 else np.tanh(out)
+    return out
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--weights', default='weights.h5')
+    parser.add_argument('--dtypes', nargs='+', default=['float32', 'float16', 'int8'])
+    parser.add_argument('--positions', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    layers = [(np.asarray(kernel, np.float32), np.asarray(bias, np.float32)) for kernel, bias in load_h5(args.weights)]
+    rng = random.Random(args.seed)
+    positions = [random_position(rng) for _ in range(args.positions)]
+    inputs = np.array([[1 if val == mark else 0 if val == 0 else -1 for val in board] for board, mark in positions],
+                      np.float32)
+    full = np.array([[board[c] != 0 for c in range(7)] for board, _ in positions])
+    reference = np.where(full, -1e7, forward(layers, inputs)).argmax(axis=1)
+    config = SimpleNamespace(rows=6, columns=7, inarow=4)
+    observations = [SimpleNamespace(board=board, mark=mark) for board, mark in positions]
+
+    print("{:<8} {:>10} {:>10} {:>10} {:>12} {:>10}".format(
+        "dtype", "file KB", "import ms", "agreement", "max error", "move us"))
+    for dtype in args.dtypes:
+        source = render_submission(layers, dtype)
+        module = types.ModuleType('submission_' + dtype)
+        start = time.perf_counter()
+        exec(source, module.__dict__)
+        import_ms = 1000 * (time.perf_counter() - start)
+        q = exported_q(module, inputs)
+        error = np.abs(q - forward(layers, inputs)).max()
+        moves = np.array([module.my_agent(obs, config) for obs in observations])
+        agreement = np.mean(moves == reference)
+        start = time.perf_counter()
+        for obs in observations:
+            module.my_agent(obs, config)
+        move_us = 1e6 * (time.perf_counter() - start) / len(observations)
+        print("{:<8} {:>10.0f} {:>10.1f} {:>10.4f} {:>12.2e} {:>10.1f}".format(
+            dtype, len(source) / 1024, import_ms, agreement, error, move_us))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Writes the Minimax-DQN agent to submission.py.
+
+The weights of every layer are packed into one base64 blob at the top of the
+generated file, which decodes them into NumPy arrays once when Kaggle imports it;
+my_agent itself only runs the forward pass. The blob stores the weights as
+
+    float32  exactly
+    float16  half the size
+    int8     a quarter of the size: each kernel column (output channel) is scaled
+             to [-127, 127] and rounded, and the layer multiplies its outputs by
+             the column scales again; biases and scales stay float32
+
+and the agent computes in float32 whatever the storage. benchmark_quantization.py
+measures how often each format picks the same move as the float32 weights.h5.
+
+    python export_submission.py --weights weights.h5 --output submission.py --dtype float16
+
+The notebook calls write_submission() with the layers of the trained model. --npz
+also saves the weights as kernel_0, bias_0, kernel_1, ... arrays, the format the
+PUCT search of monte-carlo/submission.py loads.
+"""
+
+import argparse
+import base64
+import numpy as np
+
+SUBMISSION = '''"""
+Minimax-DQN agent written by export_submission.py. The blob holds the
+{arrays} of every layer{storage}, decoded once at import.
+"""
+
+import base64
+import numpy as np
+
+# Shape and storage type of each array in the blob
+ARRAYS = {arrays_spec}
+WEIGHTS = '{blob}'
+
+def load_layers():
+    data = base64.b64decode(WEIGHTS)
+    arrays, offset = [], 0
+    for shape, dtype in ARRAYS:
+        count = int(np.prod(shape))
+        arrays.append(np.frombuffer(data, dtype, count, offset).astype(np.float32).reshape(shape))
+        offset += count * np.dtype(dtype).itemsize
+    return [tuple(arrays[i:i+{per_layer}]) for i in range(0, len(arrays), {per_layer})]
+
+LAYERS = load_layers()
+
+def my_agent(observation, configuration):
+    board = observation.board
+    out = np.array([1 if val==observation.mark else 0 if val==0 else -1 for val in board], np.float32)
+    for {names} in LAYERS[:-1]:
+        out = np.maximum(0, {layer})
+    {names} = LAYERS[-1]
+    out = np.tanh({layer})
+
+    for i in range(configuration.columns):
+        if board[i] != 0:
+            out[i] = -1e7
+
+    return int(np.argmax(out))
+'''
+
+# (kernel, bias) of every dense layer of a Keras weights file, input layer first
+def load_h5(path):
+    import h5py
+    with h5py.File(path, 'r') as weights:
+        layers = []
+        for name in weights.attrs['layer_names']:
+            group = weights[name]
+            names = group.attrs['weight_names']
+            if len(names):
+                kernel, bias = (group[weight_name][()] for weight_name in names)
+                layers.append((kernel, bias))
+        return layers
+
+# int8 kernel and float32 scale of each of its columns, so kernel ~ q * scale
+def quantize_int8(kernel):
+    scale = np.abs(kernel).max(axis=0) / 127
+    scale[scale == 0] = 1
+    q = np.clip(np.round(kernel / scale), -127, 127).astype(np.int8)
+    return q, scale.astype(np.float32)
+
+# Arrays of every layer as stored with dtype: (kernel, bias) for float32 and
+# float16, (kernel, scale, bias) for int8
+def pack_layers(layers, dtype='float16'):
+    if dtype == 'int8':
+        return [quantize_int8(np.asarray(kernel, np.float32)) + (np.asarray(bias, np.float32),)
+                for kernel, bias in layers]
+    if dtype in ('float32', 'float16'):
+        return [(np.asarray(kernel).astype(dtype), np.asarray(bias).astype(dtype)) for kernel, bias in layers]
+    raise ValueError("Unknown weight type: {}".format(dtype))
+
+# Source of the submission for the layers, with the weights stored as dtype
+def render_submission(layers, dtype='float16'):
+    packed = pack_layers(layers, dtype)
+    arrays = [array for layer in packed for array in layer]
+    blob = base64.b64encode(b''.join(array.tobytes() for array in arrays)).decode('ascii')
+    arrays_spec = [(tuple(array.shape), array.dtype.name) for array in arrays]
+    if dtype == 'int8':
+        return SUBMISSION.format(arrays="int8 kernel, column scales and bias", storage="", arrays_spec=arrays_spec,
+                                 blob=blob, per_layer=3, names="kernel, scale, bias",
+                                 layer="(out @ kernel) * scale + bias")
+    return SUBMISSION.format(arrays="kernel and bias", storage=" as " + dtype, arrays_spec=arrays_spec,
+                             blob=blob, per_layer=2, names="kernel, bias", layer="out @ kernel + bias")
+
+def write_submission(layers, path='submission.py', dtype='float16'):
+    with open(path, 'w') as f:
+        f.write(render_submission(layers, dtype))
+
+def write_npz(layers, path):
+    arrays = {}
+    for i, (kernel, bias) in enumerate(layers):
+        arrays['kernel_%d' % i], arrays['bias_%d' % i] = kernel, bias
+    np.savez(path, **arrays)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--weights', default='weights.h5')
+    parser.add_argument('--output', default='submission.py')
+    parser.add_argument('--dtype', choices=['float32', 'float16', 'int8'], default='float16',
+                        help="storage type of the weights in the blob")
+    parser.add_argument('--npz', help="also save the weights to this .npz file")
+    args = parser.parse_args()
+    layers = load_h5(args.weights)
+    write_submission(layers, args.output, args.dtype)
+    if args.npz:
+        write_npz(layers, args.npz)
+    print("Wrote {} layers to {}".format(len(layers), args.output))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark of the parallel MCTS agents: playouts per second, and win rate against the
+single-process agent, for each mode and worker count.
+
+    python benchmark_parallel.py --workers 1 2 4 8 --games 10 --timeout 1.3
+
+Playouts per second are measured on random early positions. Win rates come from
+full games against MCTSAgent with the same time per move, alternating who starts;
+a draw counts half.
+"""
+
+import argparse
+import random
+import time
+from types import SimpleNamespace
+from submission import Board, MCTSAgent, ParallelMCTSAgent, TimeManager
+
+def random_observation(config, rng, max_moves=10):
+  while True:
+    position = Board(config)
+    for _ in range(rng.randint(0, max_moves)):
+      position.play(rng.choice(position.valid_moves()))
+    if not position.is_terminal():
+      return SimpleNamespace(board=position.grid().reshape(-1).tolist(), mark=position.mark)
+
+# Winner's mark of a game between two agents (0 for a draw)
+def play_game(agents, config):
+  position = Board(config)
+  while True:
+    agent = agents[position.mark - 1]
+    obs = SimpleNamespace(board=position.grid().reshape(-1).tolist(), mark=position.mark)
+    position.play(agent(obs, config))
+    if position.is_win(3 - position.mark):
+      return 3 - position.mark
+    if position.is_full():
+      return 0
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+  parser.add_argument('--modes', nargs='+', default=["root", "tree"])
+  parser.add_argument('--positions', type=int, default=5, help="positions timed per configuration")
+  parser.add_argument('--games', type=int, default=4, help="games against the single-process agent (0 to skip)")
+  parser.add_argument('--timeout', type=float, default=1.3, help="config.timeout; 0.3 s of it is kept as margin")
+  parser.add_argument('--seed', type=int, default=0)
+  args = parser.parse_args()
+  config = SimpleNamespace(rows=6, columns=7, inarow=4, timeout=args.timeout)
+  rng = random.Random(args.seed)
+  positions = [random_observation(config, rng) for _ in range(args.positions)]
+
+  print("{:<6} {:>7} {:>12} {:>9}".format("mode", "workers", "playouts/s", "win rate"))
+  # Without early stops, so every agent searches for the whole move time
+  single = MCTSAgent(timer=TimeManager(early_stop=False))
+  rollouts, elapsed = 0, 0.0
+  for obs in positions:
+    single.mcts = None
+    start = time.perf_counter()
+    single(obs, config)
+    elapsed += time.perf_counter() - start
+    rollouts += single.mcts.rollouts
+  print("{:<6} {:>7} {:>12.0f} {:>9}".format("single", 1, rollouts / elapsed, "-"))
+
+  for mode in args.modes:
+    for workers in args.workers:
+      agent = ParallelMCTSAgent(workers, mode)
+      agent.start()
+      rollouts, elapsed = 0, 0.0
+      for obs in positions:
+        start = time.perf_counter()
+        agent(obs, config)
+        elapsed += time.perf_counter() - start
+        rollouts += agent.rollouts
+      score = 0.0
+      for game in range(args.games):
+        opponent = MCTSAgent(timer=TimeManager(early_stop=False))
+        agents = (agent, opponent) if game % 2 == 0 else (opponent, agent)
+        winner = play_game(agents, config)
+        score += 0.5 if winner == 0 else float(agents[winner-1] is agent)
+      win_rate = "{:.2f}".format(score / args.games) if args.games else "-"
+      print("{:<6} {:>7} {:>12.0f} {:>9}".format(mode, workers, rollouts / elapsed, win_rate))
+      agent.pool.shutdown()
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,67 @@
+"""
+Benchmark of the PUCT search guided by the mimimax-dqn network: leaves valued per
+second for each leaf batch size, and win rate against the rollout MCTSAgent.
+
+    python benchmark_puct.py --batch 1 8 32 --games 10 --timeout 1.3
+
+Leaves per second are measured on random early positions. Win rates come from full
+games with the same time per move (no early stops), alternating who starts; a draw
+counts half.
+"""
+
+import argparse
+import os
+import random
+import time
+from types import SimpleNamespace
+from benchmark_parallel import play_game, random_observation
+from submission import MCTSAgent, QNetwork, TimeManager
+
+WEIGHTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'mimimax-dqn', 'weights.h5')
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--weights', default=WEIGHTS, help="weights.h5 (needs h5py) or .npz of the network")
+  parser.add_argument('--batch', type=int, nargs='+', default=[1, 8, 32], help="leaves per forward pass")
+  parser.add_argument('--positions', type=int, default=5, help="positions timed per batch size")
+  parser.add_argument('--games', type=int, default=4, help="games against the rollout agent (0 to skip)")
+  parser.add_argument('--timeout', type=float, default=1.3, help="config.timeout; 0.3 s of it is kept as margin")
+  parser.add_argument('--seed', type=int, default=0)
+  args = parser.parse_args()
+  network = QNetwork.load(args.weights)
+  config = SimpleNamespace(rows=6, columns=7, inarow=4, timeout=args.timeout)
+  rng = random.Random(args.seed)
+  random.seed(args.seed)
+  positions = [random_observation(config, rng) for _ in range(args.positions)]
+
+  print("{:<8} {:>7} {:>12} {:>9}".format("search", "batch", "leaves/s", "win rate"))
+  single = MCTSAgent(timer=TimeManager(early_stop=False))
+  rollouts, elapsed = 0, 0.0
+  for obs in positions:
+    single.mcts = None
+    start = time.perf_counter()
+    single(obs, config)
+    elapsed += time.perf_counter() - start
+    rollouts += single.mcts.rollouts
+  print("{:<8} {:>7} {:>12.0f} {:>9}".format("rollout", "-", rollouts / elapsed, "-"))
+  for batch in args.batch:
+    agent = MCTSAgent(network=network, batch_leaves=batch, timer=TimeManager(early_stop=False))
+    evaluations, elapsed = 0, 0.0
+    for obs in positions:
+      agent.mcts = None
+      start = time.perf_counter()
+      agent(obs, config)
+      elapsed += time.perf_counter() - start
+      evaluations += agent.mcts.evaluations
+    score = 0.0
+    for game in range(args.games):
+      agent.mcts = None
+      opponent = MCTSAgent(timer=TimeManager(early_stop=False))
+      agents = (agent, opponent) if game % 2 == 0 else (opponent, agent)
+      winner = play_game(agents, config)
+      score += 0.5 if winner == 0 else float(agents[winner-1] is agent)
+    win_rate = "{:.2f}".format(score / args.games) if args.games else "-"
+    print("{:<8} {:>7} {:>12.0f} {:>9}".format("puct", batch, evaluations / elapsed, win_rate))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,108 @@
+"""
+Rollouts per second of the MCTS simulators, from random positions of the standard board.
+
+  bitboard        Board.rollout(), random moves to the end of the game
+  bitboard-light  Board.rollout(light=True), taking immediate wins
+  batch-K         Board.batch_rollout(K), K playouts in lockstep as one NumPy batch
+  grid            the previous simulator (NumPy grid copies and window scans, and
+                  at most three rounds of moves instead of a full game), kept here
+                  for comparison
+
+    python benchmark_rollouts.py --seconds 2
+"""
+
+import argparse
+import random
+import time
+from types import SimpleNamespace
+from submission import Board
+
+def put_new_piece(grid, col, mark, config):
+  next_state = grid.copy()
+  for row in range(config.rows-1, -1, -1):
+    if not next_state[row][col]:
+      break
+  next_state[row][col] = mark
+  return next_state
+
+def check_result(grid, piece, config):
+  for row in range(config.rows):
+    for col in range(config.columns-(config.inarow-1)):
+      if list(grid[row, col:col+config.inarow]).count(piece) == config.inarow:
+        return True
+  for row in range(config.rows-(config.inarow-1)):
+    for col in range(config.columns):
+      if list(grid[row:row+config.inarow, col]).count(piece) == config.inarow:
+        return True
+  for row in range(config.rows-(config.inarow-1)):
+    for col in range(config.columns-(config.inarow-1)):
+      if list(grid[range(row, row+config.inarow), range(col, col+config.inarow)]).count(piece) == config.inarow:
+        return True
+  for row in range(config.inarow-1, config.rows):
+    for col in range(config.columns-(config.inarow-1)):
+      if list(grid[range(row, row-config.inarow, -1), range(col, col+config.inarow)]).count(piece) == config.inarow:
+        return True
+  return False
+
+# The simulation of the original MCTS agent, on the grid of a position
+def grid_rollout(position, config):
+  state = position.grid()
+  previous_player = 3 - position.mark
+  is_terminal = check_result(state, previous_player, config)
+  winning_player = previous_player
+  count = 0
+  while not is_terminal:
+    actions_available = [c for c in range(config.columns) if not state[0][c]]
+    if not actions_available or count == 3:
+      winning_player = None
+      is_terminal = True
+    else:
+      count += 1
+      current_player = 3 - previous_player
+      for action in actions_available:
+        state = put_new_piece(state, action, current_player, config)
+        if check_result(state, current_player, config):
+          is_terminal = True
+          winning_player = current_player
+          break
+    previous_player = current_player
+  return winning_player
+
+def random_position(config, rng, max_moves=12):
+  while True:
+    position = Board(config)
+    for _ in range(rng.randint(0, max_moves)):
+      position.play(rng.choice(position.valid_moves()))
+    if not position.is_win(3 - position.mark):
+      return position
+
+# `rollout` plays `per_call` playouts from a position
+def rollouts_per_second(rollout, positions, seconds, per_call=1):
+  calls = 0
+  start = time.perf_counter()
+  while time.perf_counter() - start < seconds:
+    rollout(positions[calls % len(positions)])
+    calls += 1
+  return calls * per_call / (time.perf_counter() - start)
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--seconds', type=float, default=2.0, help="time spent on each simulator")
+  parser.add_argument('--batch', type=int, nargs='*', default=[16, 64, 256], help="batch sizes to time")
+  parser.add_argument('--seed', type=int, default=0)
+  args = parser.parse_args()
+  config = SimpleNamespace(rows=6, columns=7, inarow=4)
+  rng = random.Random(args.seed)
+  positions = [random_position(config, rng) for _ in range(100)]
+  simulators = [
+    ("bitboard", lambda position: position.rollout(), 1),
+    ("bitboard-light", lambda position: position.rollout(light=True), 1),
+    ("grid", lambda position: grid_rollout(position, config), 1),
+  ]
+  for k in args.batch:
+    simulators.append(("batch-{}".format(k), lambda position, k=k: position.batch_rollout(k), k))
+  for name, rollout, per_call in simulators:
+    print("{:<16} {:>10.0f} rollouts/s".format(name, rollouts_per_second(rollout, positions, args.seconds, per_call)))
+
+if __name__ == '__main__':
+  main()
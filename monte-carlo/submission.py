@@ -1,233 +1,848 @@
-def connectx_agent(obs, config):
-
-  import math
-  import random
-  import time
-  import numpy as np
-
-  def put_new_piece(grid, col, mark, config):
-    next_state = grid.copy()
+import math
+import multiprocessing
+import random
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from types import SimpleNamespace
+import numpy as np
+
+_CELL_WINDOWS = {}
+
+# For every flat cell (row-major, row 0 at the top), the flat cells of each line of
+# inarow cells through it, padded with lines of the extra cell rows*columns (always
+# empty) so every cell has the same number. Built once per configuration.
+def cell_windows(config):
+  key = (config.rows, config.columns, config.inarow)
+  if key not in _CELL_WINDOWS:
+    rows, columns, inarow = key
+    lines = [[] for _ in range(rows*columns)]
+    for row in range(rows):
+      for col in range(columns):
+        for drow, dcol in ((0, 1), (1, 0), (1, 1), (-1, 1)):
+          cells = [(row + i*drow, col + i*dcol) for i in range(inarow)]
+          if all(0 <= r < rows and 0 <= c < columns for r, c in cells):
+            for r, c in cells:
+              lines[r*columns + c].append([r2*columns + c2 for r2, c2 in cells])
+    width = max(len(cell_lines) for cell_lines in lines)
+    padding = [rows*columns] * inarow
+    _CELL_WINDOWS[key] = np.array([cell_lines + [padding]*(width-len(cell_lines)) for cell_lines in lines])
+  return _CELL_WINDOWS[key]
+
+class Board():
+  '''
+  Bitboard of a position: one integer of discs per mark, (rows+1) bits per column
+  filled from the bottom up, the extra bit on top of each column always empty so
+  lines cannot wrap from one column into the next.
+  '''
+
+  def __init__(self, config):
+    self.rows = config.rows
+    self.columns = config.columns
+    self.inarow = config.inarow
+    self.stride = config.rows + 1
+    # Shifts for vertical, horizontal and both diagonal directions
+    self.directions = (1, self.stride, self.stride - 1, self.stride + 1)
+    # Line check for each direction in log(inarow) steps: after shifting by 1, 2, 4...
+    # times the direction, the runs cover twice as many cells, and a last shift tops
+    # them up to inarow
+    self.line_shifts = []
+    for shift in self.directions:
+      steps, length = [], 1
+      while 2*length <= self.inarow:
+        steps.append(length*shift)
+        length *= 2
+      if length < self.inarow:
+        steps.append((self.inarow-length)*shift)
+      self.line_shifts.append(steps)
+    self.boards = [0, 0, 0]
+    self.heights = [0] * config.columns
+    self.count = 0
+    # Columns played, to take moves back
+    self.moves = []
+    # Mark of the player to move
+    self.mark = 1
+    # Bit of each cell in obs.board order
+    self.cell_bits = np.array([col*self.stride + self.rows-1-row for row in range(self.rows)
+                               for col in range(self.columns)], dtype=np.uint64)
+
+  @classmethod
+  def from_board(cls, board, mark, config):
+    position = cls(config)
     for row in range(config.rows-1, -1, -1):
-      if not next_state[row][col]:
+      for col in range(config.columns):
+        piece = board[row*config.columns + col]
+        if piece:
+          position.boards[piece] |= 1 << (col*position.stride + position.heights[col])
+          position.heights[col] += 1
+          position.count += 1
+    position.mark = mark
+    return position
+
+  def copy(self):
+    position = Board.__new__(Board)
+    position.__dict__.update(self.__dict__)
+    position.boards = self.boards[:]
+    position.heights = self.heights[:]
+    position.moves = self.moves[:]
+    return position
+
+  def can_play(self, col):
+    return self.heights[col] < self.rows
+
+  def valid_moves(self):
+    return [c for c in range(self.columns) if self.heights[c] < self.rows]
+
+  # Drops a disc for the player to move and passes the turn
+  def play(self, col):
+    self.boards[self.mark] |= 1 << (col*self.stride + self.heights[col])
+    self.heights[col] += 1
+    self.count += 1
+    self.moves.append(col)
+    self.mark = 3 - self.mark
+
+  def undo(self):
+    col = self.moves.pop()
+    self.mark = 3 - self.mark
+    self.count -= 1
+    self.heights[col] -= 1
+    self.boards[self.mark] &= ~(1 << (col*self.stride + self.heights[col]))
+
+  def is_win(self, mark):
+    return self.has_line(self.boards[mark])
+
+  # Whether the discs of a bitboard have inarow in a line
+  def has_line(self, bitboard):
+    for steps in self.line_shifts:
+      run = bitboard
+      for shift in steps:
+        run &= run >> shift
+      if run:
+        return True
+    return False
+
+  # Plays random moves until the game ends and returns the winner's mark, None for
+  # a draw. The position itself is left unchanged. Only the player who just moved
+  # is checked for a win. With light=True a player takes an immediate win when
+  # there is one.
+  def rollout(self, light=False, choice=random.choice):
+    boards = self.boards[:]
+    heights = self.heights[:]
+    mark = self.mark
+    stride, rows, has_line = self.stride, self.rows, self.has_line
+    moves = [c for c in range(self.columns) if heights[c] < rows]
+    for _ in range(self.rows*self.columns - self.count):
+      col = None
+      if light:
+        for move in moves:
+          if has_line(boards[mark] | 1 << (move*stride + heights[move])):
+            col = move
+            break
+      if col is None:
+        col = choice(moves)
+      board = boards[mark] | 1 << (col*stride + heights[col])
+      boards[mark] = board
+      heights[col] += 1
+      if heights[col] == rows:
+        moves.remove(col)
+      if has_line(board):
+        return mark
+      mark = 3 - mark
+    return None
+
+  def is_full(self):
+    return self.count == self.rows * self.columns
+
+  # Game over: only the player who moved last can have won
+  def is_terminal(self):
+    return self.is_full() or self.is_win(3 - self.mark)
+
+  # Mirror image of a bitboard: column c becomes column columns-1-c
+  def mirror(self, bitboard):
+    column = (1 << self.stride) - 1
+    mirrored = 0
+    for col in range(self.columns):
+      mirrored |= ((bitboard >> (col*self.stride)) & column) << ((self.columns-1-col)*self.stride)
+    return mirrored
+
+  def is_symmetric(self):
+    return all(self.mirror(self.boards[mark]) == self.boards[mark] for mark in (1, 2))
+
+  # Plays k random games from the position in lockstep on a (k, rows, columns) NumPy
+  # batch and returns the winner's mark of each (0 for a draw). Every step samples a
+  # legal column for all unfinished games at once, drops the discs and checks the
+  # lines through the new discs.
+  def batch_rollout(self, k, rng=np.random):
+    rows, columns = self.rows, self.columns
+    windows = cell_windows(self)
+    # One extra always-empty cell per game for the padding lines
+    cells = np.zeros((k, rows*columns + 1), dtype=np.int8)
+    cells[:, :-1] = self.grid().reshape(-1)
+    heights = np.tile(np.array(self.heights), (k, 1))
+    mark = np.full(k, self.mark, dtype=np.int8)
+    winners = np.zeros(k, dtype=np.int8)
+    playing = np.arange(k)
+    for _ in range(rows*columns - self.count):
+      # Random legal column of every unfinished game
+      keys = rng.random_sample((len(playing), columns))
+      keys[heights[playing] >= rows] = -1
+      col = keys.argmax(axis=1)
+      cell = (rows-1-heights[playing, col])*columns + col
+      cells[playing, cell] = mark[playing]
+      heights[playing, col] += 1
+      lines = cells[playing[:, None, None], windows[cell]]
+      won = (lines == mark[playing, None, None]).all(axis=-1).any(axis=-1)
+      winners[playing[won]] = mark[playing[won]]
+      mark[playing] = 3 - mark[playing]
+      playing = playing[~won]
+      if not len(playing):
         break
-    next_state[row][col] = mark
-    return next_state
-
-  def check_result(grid, piece, config):
-
-    def look_for_window(window):
-      return (window.count(piece) == 4 and window.count(0) == config.inarow - 4)
-
-    def calculate_windows():
-      is_success = False
-      sequences = ['horizontal', 'vertical', 'p_diagonal', 'n_diagonal']
-
-      for sequence_type in sequences:
-
-        if sequence_type == 'horizontal':
-          for row in range(config.rows):
-            for col in range(config.columns-(config.inarow-1)):
-                window = list(grid[row, col:col+config.inarow])
-                if look_for_window(window):
-                  return True
-
-        elif sequence_type == 'vertical':
-          for row in range(config.rows-(config.inarow-1)):
-            for col in range(config.columns):
-                window = list(grid[row:row+config.inarow, col])
-                if look_for_window(window):
-                  return True
-
-        elif sequence_type == 'p_diagonal':
-          for row in range(config.rows-(config.inarow-1)):
-            for col in range(config.columns-(config.inarow-1)):
-                window = list(grid[range(row, row+config.inarow), range(col, col+config.inarow)])
-                if look_for_window(window):
-                  return True
-
-        elif  sequence_type == 'n_diagonal':
-          for row in range(config.inarow-1, config.rows):
-            for col in range(config.columns-(config.inarow-1)):
-                window = list(grid[range(row, row-config.inarow, -1), range(col, col+config.inarow)])
-                if look_for_window(window):
-                  return True
-
-      return is_success
-
-    return calculate_windows()
-
-  class MCTS():
-
-    def __init__(self, obs, config):
-
-      self.state = np.asarray(obs.board).reshape(config.rows, config.columns)
-      self.config = config
-      self.player = obs.mark
-      self.final_action = None
-      self.time_limit = self.config.timeout - 0.3
-      self.root_node = (0,)
-      self.tunable_constant = 1.0
-
-      self.tree = {self.root_node:{'state':self.state, 'player':self.player,
-                              'child':[], 'parent': None, 'total_node_visits':0,
-                              'total_node_wins':0}}
-      self.total_parent_node_visits = 0
-
-    def get_ucb(self, node_no):
-      if not self.total_parent_node_visits:
-        return math.inf
+    return winners
+
+  # Row-major grid like obs.board, row 0 at the top
+  def grid(self):
+    grid = np.zeros((self.rows, self.columns), dtype=int)
+    for mark in (1, 2):
+      for col in range(self.columns):
+        for height in range(self.heights[col]):
+          if self.boards[mark] >> (col*self.stride + height) & 1:
+            grid[self.rows-1-height, col] = mark
+    return grid
+
+  # Network input in obs.board order: 1 for the discs of the player to move, -1 for
+  # the opponent's and 0 for empty cells
+  def encode(self):
+    own = (np.uint64(self.boards[self.mark]) >> self.cell_bits) & np.uint64(1)
+    opp = (np.uint64(self.boards[3 - self.mark]) >> self.cell_bits) & np.uint64(1)
+    return own.astype(np.float32) - opp.astype(np.float32)
+
+class NodeStore():
+  '''
+  Search tree as parallel arrays indexed by node id. The children of a node are
+  created together, so they are the ids first_child .. first_child+num_children-1.
+  A node only records the move leading to it; its position is rebuilt by replaying
+  the moves from the root.
+  '''
+
+  def __init__(self):
+    self.parent = array('i')
+    # Column played to reach the node, and the mark that played it
+    self.move = array('b')
+    self.player = array('b')
+    self.first_child = array('i')
+    self.num_children = array('b')
+    self.visits = array('i')
+    self.value = array('d')
+    # Probability of the move in the parent given by the network (PUCT only)
+    self.prior = array('f')
+
+  def __len__(self):
+    return len(self.parent)
+
+  def add(self, parent, move, player, prior=1.0):
+    self.parent.append(parent)
+    self.move.append(move)
+    self.player.append(player)
+    self.first_child.append(-1)
+    self.num_children.append(0)
+    self.visits.append(0)
+    self.value.append(0.0)
+    self.prior.append(prior)
+    return len(self.parent) - 1
+
+  # Creates one child of node per move, played by player, with the priors if given
+  def add_children(self, node, moves, player, priors=None):
+    self.first_child[node] = len(self)
+    self.num_children[node] = len(moves)
+    for k, move in enumerate(moves):
+      self.add(node, move, player, 1.0 if priors is None else priors[k])
+
+  def children(self, node):
+    first = self.first_child[node]
+    return range(first, first + self.num_children[node])
+
+  # Moves from the root to node
+  def path(self, node):
+    moves = []
+    while self.parent[node] >= 0:
+      moves.append(self.move[node])
+      node = self.parent[node]
+    return moves[::-1]
+
+  # Child of node reached by move, or None
+  def child(self, node, move):
+    for child_id in self.children(node):
+      if self.move[child_id] == move:
+        return child_id
+    return None
+
+  # Copy of the subtree under node, which becomes the root (id 0). With `columns`
+  # given, the moves are mirrored (column c becomes columns-1-c).
+  def subtree(self, node, columns=None):
+    tree = NodeStore()
+    root = tree.add(-1, -1, self.player[node], self.prior[node])
+    tree.visits[root], tree.value[root] = self.visits[node], self.value[node]
+    queue = [(node, root)]
+    for old_id, new_id in queue:
+      if not self.num_children[old_id]:
+        continue
+      tree.first_child[new_id] = len(tree)
+      tree.num_children[new_id] = self.num_children[old_id]
+      for old_child in self.children(old_id):
+        move = self.move[old_child] if columns is None else columns-1-self.move[old_child]
+        new_child = tree.add(new_id, move, self.player[old_child], self.prior[old_child])
+        tree.visits[new_child], tree.value[new_child] = self.visits[old_child], self.value[old_child]
+        queue.append((old_child, new_child))
+    return tree
+
+class SharedNodeStore(NodeStore):
+  '''
+  NodeStore of fixed capacity in a shared_memory block, so several processes can
+  grow one tree. Nodes are allocated under a lock, and a node's children become
+  visible only once they are filled in; visit and value updates take no lock
+  (an update lost to a race costs one sample).
+  '''
+
+  FIELDS = (('parent', np.int32), ('move', np.int8), ('player', np.int8), ('first_child', np.int32),
+            ('num_children', np.int8), ('visits', np.int32), ('value', np.float64), ('prior', np.float32))
+
+  def __init__(self, capacity, lock, name=None):
+    self.capacity = capacity
+    self.lock = lock
+    # Node count first, then one array per field, each starting on 8 bytes
+    offsets, size = [], 8
+    for _, dtype in self.FIELDS:
+      offsets.append(size)
+      size += -(-capacity * np.dtype(dtype).itemsize // 8) * 8
+    if name is None:
+      self.memory = shared_memory.SharedMemory(create=True, size=size)
+    else:
+      self.memory = shared_memory.SharedMemory(name=name)
+    self.name = self.memory.name
+    self.owner = name is None
+    self.count = np.ndarray((1,), dtype=np.int64, buffer=self.memory.buf)
+    for (field, dtype), offset in zip(self.FIELDS, offsets):
+      setattr(self, field, np.ndarray((capacity,), dtype=dtype, buffer=self.memory.buf, offset=offset))
+    if self.owner:
+      self.count[0] = 0
+
+  def __len__(self):
+    return int(self.count[0])
+
+  def _init(self, node, parent, move, player, prior):
+    self.parent[node] = parent
+    self.move[node] = move
+    self.player[node] = player
+    self.first_child[node] = -1
+    self.num_children[node] = 0
+    self.visits[node] = 0
+    self.value[node] = 0.0
+    self.prior[node] = prior
+
+  def add(self, parent, move, player, prior=1.0):
+    with self.lock:
+      node = len(self)
+      if node == self.capacity:
+        raise MemoryError("SharedNodeStore is full")
+      self._init(node, parent, move, player, prior)
+      self.count[0] = node + 1
+    return node
+
+  # Creates the children of node unless another process already has, or the store is full
+  def add_children(self, node, moves, player, priors=None):
+    with self.lock:
+      first = len(self)
+      if self.num_children[node] or first + len(moves) > self.capacity:
+        return
+      for k, move in enumerate(moves):
+        self._init(first + k, node, move, player, 1.0 if priors is None else priors[k])
+      self.count[0] = first + len(moves)
+      self.first_child[node] = first
+      self.num_children[node] = len(moves)
+
+  def close(self):
+    for field, _ in self.FIELDS:
+      delattr(self, field)
+    del self.count
+    self.memory.close()
+    if self.owner:
+      self.memory.unlink()
+
+class QNetwork():
+  '''
+  Minimax-DQN network trained in mimimax-dqn: dense ReLU layers and a tanh output
+  layer giving, for a batch of Board.encode() inputs, the value in [-1, 1] of
+  every column for the player to move. load() reads the Keras weights.h5 (with
+  h5py) or a .npz of arrays kernel_0, bias_0, kernel_1, ...
+  '''
+
+  def __init__(self, layers):
+    self.layers = [(np.asarray(kernel, np.float32), np.asarray(bias, np.float32)) for kernel, bias in layers]
+
+  @classmethod
+  def load(cls, path):
+    if path.endswith('.npz'):
+      with np.load(path) as arrays:
+        return cls([(arrays['kernel_%d' % i], arrays['bias_%d' % i]) for i in range(len(arrays.files) // 2)])
+    import h5py
+    with h5py.File(path, 'r') as weights:
+      layers = []
+      for name in weights.attrs['layer_names']:
+        group = weights[name]
+        names = group.attrs['weight_names']
+        if len(names):
+          kernel, bias = (group[weight_name][()] for weight_name in names)
+          layers.append((kernel, bias))
+      return cls(layers)
+
+  def __call__(self, inputs):
+    out = inputs
+    for kernel, bias in self.layers[:-1]:
+      out = np.maximum(out @ kernel + bias, 0)
+    kernel, bias = self.layers[-1]
+    return np.tanh(out @ kernel + bias)
+
+# Iterations between two looks at the clock, for one playout per iteration
+CLOCK_INTERVAL = 64
+
+class TimeManager():
+  '''
+  Time budget of one MCTS move. The search may use actTimeout (or timeout) less a
+  margin, plus a share of the banked overage time (obs.remainingOverageTime) spread
+  over the moves we have left. It runs until the target time, and on to the hard
+  limit when the position is critical: the two most visited root moves are close
+  in value, or the most visited one is not the best valued, unless that value is
+  already a near-certain win or loss. It stops early once
+  the most visited root move cannot be caught by the runner-up any more, even if
+  every remaining iteration went to it.
+  '''
+
+  def __init__(self, margin=0.3, overage_fraction=0.5, overage_reserve=2.0, extension=3.0, close=0.05,
+               early_stop=True):
+    # Seconds of the move time kept for the framework
+    self.margin = margin
+    # Fraction of the overage beyond overage_reserve seconds the game may use
+    self.overage_fraction = overage_fraction
+    self.overage_reserve = overage_reserve
+    # Hard limit of a critical position, in overage shares past the move time
+    self.extension = extension
+    # Root values closer than this make the position critical
+    self.close = close
+    self.early_stop = early_stop
+
+  def start(self, obs, config, empties):
+    '''
+    Aim - Set the target and hard limit (time.perf_counter() values) of a move
+          starting now with `empties` empty cells on the board
+    '''
+    self.started = time.perf_counter()
+    move_time = getattr(config, 'actTimeout', None) or getattr(config, 'timeout', None) or 2
+    base = max(move_time - self.margin, 0)
+    overage = max((getattr(obs, 'remainingOverageTime', None) or 0) - self.overage_reserve, 0)
+    share = self.overage_fraction * overage / max((empties+1) // 2, 1)
+    self.target = self.started + base + share
+    self.limit = self.started + base + min(self.extension*share, self.overage_fraction*overage)
+
+  def critical(self, visits, values):
+    best, second = sorted(range(len(visits)), key=lambda i: -visits[i])[:2]
+    if not self.close < max(values) < 1 - self.close:
+      return False
+    return values[second] >= values[best] - self.close
+
+  def stop(self, mcts, iterations, now):
+    '''
+    Aim - Whether the search should stop at time `now`, after `iterations`
+          iterations of this move
+    '''
+    if now >= self.limit:
+      return True
+    tree = mcts.tree
+    children = list(tree.children(mcts.root_node))
+    if len(children) == 1:
+      return True
+    if len(children) < 2:
+      return False
+    visits = [tree.visits[child_id] for child_id in children]
+    values = [tree.value[child_id] / max(tree.visits[child_id], 1) for child_id in children]
+    critical = now >= self.target and self.critical(visits, values)
+    if self.early_stop:
+      # Iterations left before the deadline that applies, at the rate so far
+      end = self.limit if critical else self.target
+      remaining = iterations / max(now - self.started, 1e-9) * (end - now)
+      first, second = sorted(visits, reverse=True)[:2]
+      if first - second > remaining:
+        return True
+    return now >= self.target and not critical
+
+class MCTS():
+
+  def __init__(self, obs, config, tree=None, light_rollouts=False, batch_rollouts=1, virtual_loss=0, timer=None,
+               network=None, batch_leaves=8, c_puct=1.5, prior_temperature=0.25):
+
+    self.obs = obs
+    self.board = Board.from_board(obs.board, obs.mark, config)
+    self.config = config
+    self.player = obs.mark
+    # Decides how long start_the_game searches
+    self.timer = timer if timer is not None else TimeManager()
+    self.tunable_constant = 1.0
+    # Rollouts take immediate wins instead of playing purely at random
+    self.light_rollouts = light_rollouts
+    # Playouts per simulation: above 1 they run together as one NumPy batch
+    # (Board.batch_rollout) and their average is backed up
+    self.batch_rollouts = batch_rollouts
+    # Visits added to the nodes of a path while it is being simulated, which count as
+    # losses until the result is backed up; lets several processes share one tree
+    # without all following the same path
+    self.virtual_loss = virtual_loss
+    self.rollouts = 0
+    # With a QNetwork the search is PUCT instead of UCT with rollouts: leaves are
+    # valued by the network, which also gives the priors of their moves. Up to
+    # batch_leaves leaves are selected (apart, with virtual loss) and evaluated in
+    # one forward pass.
+    self.network = network
+    self.batch_leaves = batch_leaves
+    self.c_puct = c_puct
+    # Priors are the softmax of the network's move values over this temperature
+    self.prior_temperature = prior_temperature
+    if network is not None and batch_leaves > 1:
+      self.virtual_loss = max(virtual_loss, 1)
+    # Leaves valued by the network
+    self.evaluations = 0
+
+    # A tree kept from the previous turn (see MCTSAgent) has this position at its root
+    if tree is None:
+      tree = NodeStore()
+      # The root is reached by the opponent's last move
+      tree.add(-1, -1, 3 - self.player)
+    self.tree = tree
+    self.root_node = 0
+
+  # UCB1 of a node for the player who moved into it; node values are the rewards of
+  # that player (1 for a win, 0.5 for a draw)
+  def get_ucb(self, node_id, log_parent_visits):
+    visits = self.tree.visits[node_id]
+    if not visits:
+      return math.inf
+    value_estimate = self.tree.value[node_id] / visits
+    exploration = math.sqrt(2*log_parent_visits / visits)
+    return value_estimate + self.tunable_constant * exploration
+
+  # PUCT of a node for the player who moved into it; unvisited nodes take the
+  # first-play value fpu
+  def get_puct(self, node_id, sqrt_parent_visits, fpu):
+    visits = self.tree.visits[node_id]
+    value_estimate = self.tree.value[node_id] / visits if visits else fpu
+    return value_estimate + self.c_puct * self.tree.prior[node_id] * sqrt_parent_visits / (1 + visits)
+
+  def selection(self):
+    '''
+    Aim - Walk down from the root through the children with the maximum UCB
+          (each parent's own visit count) until a node without children.
+          Returns the path of node ids and the position of its last node.
+    '''
+    position = self.board.copy()
+    node_id = self.root_node
+    path = [node_id]
+    self.tree.visits[node_id] += self.virtual_loss
+    while self.tree.num_children[node_id]:
+      parent_visits = self.tree.visits[node_id]
+      if self.network is None:
+        log_parent_visits = math.log(parent_visits)
+        node_id = max(self.tree.children(node_id), key=lambda child_id: self.get_ucb(child_id, log_parent_visits))
       else:
-        value_estimate = self.tree[node_no]['total_node_wins'] / (self.tree[node_no]['total_node_visits'] + 1)
-        exploration = math.sqrt(2*math.log(self.total_parent_node_visits) / (self.tree[node_no]['total_node_visits'] + 1))
-        ucb_score =  value_estimate + self.tunable_constant * exploration
-        return ucb_score
-
-    def selection(self):
-      '''
-      Aim - To select the leaf node with the maximum UCB
-      '''
-      is_terminal_state = False
-      leaf_node_id = (0,)
-      while not is_terminal_state:
-        node_id = leaf_node_id
-        number_of_child = len(self.tree[node_id]['child'])
-        if not number_of_child:
-          leaf_node_id = node_id
-          is_terminal_state = True
-        else:
-          max_ucb_score = -math.inf
-          best_action = leaf_node_id
-          for i in range(number_of_child):
-            action = self.tree[node_id]['child'][i]
-            child_id = leaf_node_id + (action,)
-            current_ucb = self.get_ucb(child_id)
-            if current_ucb > max_ucb_score:
-              max_ucb_score = current_ucb
-              best_action = action
-          leaf_node_id = leaf_node_id + (best_action,)
-      return leaf_node_id
-
-    def expansion(self, leaf_node_id):
-      '''
-      Aim - Add new nodes to the current leaf node by taking a random action
-            and then take a random or follow any policy to take opponent's action.
-      '''
-      current_state = self.tree[leaf_node_id]['state']
-      player_mark = self.tree[leaf_node_id]['player']
-      current_board = np.asarray(current_state).reshape(config.rows*config.columns)
-      self.actions_available = [c for c in range(self.config.columns) if not current_board[c]]
-      done = check_result(current_state, player_mark, self.config)
-      child_node_id = leaf_node_id
-      is_availaible = False
-
-      if len(self.actions_available) and not done:
-        childs = []
-        for action in self.actions_available:
-          child_id = leaf_node_id + (action,)
-          childs.append(action)
-          new_board = put_new_piece(current_state, action, player_mark, self.config)
-          self.tree[child_id] = {'state': new_board, 'player': player_mark,
-                                 'child': [], 'parent': leaf_node_id,
-                                 'total_node_visits':0, 'total_node_wins':0}
-
-          if check_result(new_board, player_mark, self.config):
-            best_action = action
-            is_availaible = True
-
-        self.tree[leaf_node_id]['child'] = childs
-        
-        if is_availaible:
-          child_node_id = best_action
-        else:
-          child_node_id = random.choice(childs)
-
-      return leaf_node_id + (child_node_id,)
-
-    def simulation(self, child_node_id):
-      '''
-      Aim - Reach the final state of the game
-      '''
-      self.total_parent_node_visits += 1
-      state = self.tree[child_node_id]['state']
-      previous_player = self.tree[child_node_id]['player']
-
-      is_terminal = check_result(state, previous_player, self.config)
-      winning_player = previous_player
-      count = 0
-
-      while not is_terminal:
-
-        current_board = np.asarray(state).reshape(config.rows*config.columns)
-        self.actions_available = [c for c in range(self.config.columns) if not current_board[c]]
-
-        if not len(self.actions_available) or count==3:
-          winning_player = None
-          is_terminal = True
-
-        else:
-          count+=1
-          if previous_player == 1:
-            current_player = 2
-          else:
-            current_player = 1
-
-          for actions in self.actions_available:
-            state = put_new_piece(state, actions, current_player, self.config)
-            result = check_result(state, current_player, self.config)
-            if result: # A player won the game
-              is_terminal = True
-              winning_player = current_player
-              break
-
-
-        previous_player = current_player
-
-      return winning_player
-
-    def backpropagation(self, child_node_id, winner):
-      '''
-      Aim - Update the traversed nodes
-      '''
-      player = self.tree[(0,)]['player']
-
-      if winner == None:
-        reward = 0
-      elif winner == player:
-        reward = 1
+        sqrt_parent_visits = math.sqrt(max(parent_visits, 1))
+        # An unvisited move is worth what the parent is worth to the player making it
+        fpu = 1 - self.tree.value[node_id] / parent_visits if parent_visits else 0.5
+        node_id = max(self.tree.children(node_id),
+                      key=lambda child_id: self.get_puct(child_id, sqrt_parent_visits, fpu))
+      position.play(int(self.tree.move[node_id]))
+      path.append(node_id)
+      self.tree.visits[node_id] += self.virtual_loss
+    return path, position
+
+  def expansion(self, path, position):
+    '''
+    Aim - Add the children of the leaf node, unless the game is over there, and
+          step into one of them: a winning move if there is one, else a random one.
+    '''
+    leaf_node_id = path[-1]
+    if position.is_terminal():
+      return path
+    self.actions_available = self.moves(position)
+
+    player_mark = position.mark
+    self.tree.add_children(leaf_node_id, self.actions_available, player_mark)
+    childs = list(self.tree.children(leaf_node_id))
+    if not childs:
+      # A fixed-size store is full: simulate from the leaf itself
+      return path
+    winning = []
+    for child_id in childs:
+      position.play(int(self.tree.move[child_id]))
+      if position.is_win(player_mark):
+        winning.append(child_id)
+      position.undo()
+
+    child_node_id = winning[-1] if winning else random.choice(childs)
+    position.play(int(self.tree.move[child_node_id]))
+    path.append(child_node_id)
+    self.tree.visits[child_node_id] += self.virtual_loss
+    return path
+
+  # Moves to expand: mirror-image moves lead to mirror-image positions of the same
+  # value, so a symmetric position keeps one of each pair
+  def moves(self, position):
+    moves = position.valid_moves()
+    if position.is_symmetric():
+      moves = [c for c in moves if c <= self.config.columns-1-c]
+    return moves
+
+  def simulation(self, position):
+    '''
+    Aim - Play the game out at random from the position, returns the reward of
+          mark 1 (1 for a win, 0.5 for a draw, 0 for a loss), averaged over the
+          playouts of a batch
+    '''
+    if position.is_win(3 - position.mark):
+      return 1.0 if position.mark == 2 else 0.0
+    if self.batch_rollouts > 1:
+      self.rollouts += self.batch_rollouts
+      winners = position.batch_rollout(self.batch_rollouts)
+      return float(np.mean(np.where(winners == 0, 0.5, winners == 1)))
+    self.rollouts += 1
+    winner = position.rollout(self.light_rollouts)
+    return 0.5 if winner is None else float(winner == 1)
+
+  def backpropagation(self, path, reward):
+    '''
+    Aim - Update every node on the path, each from the point of view of the
+          player who moved into it
+    '''
+    for node_id in path:
+      self.tree.visits[node_id] += 1 - self.virtual_loss
+      self.tree.value[node_id] += reward if self.tree.player[node_id] == 1 else 1 - reward
+
+  def evaluate_leaves(self):
+    '''
+    Aim - PUCT step: select up to batch_leaves leaves, stopping at the first
+          one already selected, value the new ones with one forward pass of
+          the network, expand them with the network's priors and back up the
+          values. Returns the number of leaves.
+    '''
+    paths, positions, leaves = [], [], set()
+    for _ in range(self.batch_leaves):
+      path, position = self.selection()
+      if path[-1] in leaves:
+        for node_id in path:
+          self.tree.visits[node_id] -= self.virtual_loss
+        break
+      leaves.add(path[-1])
+      paths.append(path)
+      positions.append(position)
+    pending = [k for k, position in enumerate(positions) if not position.is_terminal()]
+    values = self.network(np.stack([positions[k].encode() for k in pending])) if pending else []
+    self.evaluations += len(pending)
+    rewards = {}
+    for k, position in enumerate(positions):
+      if position.is_win(3 - position.mark):
+        rewards[k] = 1.0 if position.mark == 2 else 0.0
+      elif position.is_full():
+        rewards[k] = 0.5
+    for k, move_values in zip(pending, values):
+      position = positions[k]
+      moves = self.moves(position)
+      move_values = move_values[moves]
+      # The network's value of the position is that of its best move, for the player to move
+      value = (float(move_values.max()) + 1) / 2
+      priors = np.exp((move_values - move_values.max()) / self.prior_temperature)
+      priors /= priors.sum()
+      if not self.tree.num_children[paths[k][-1]]:
+        self.tree.add_children(paths[k][-1], moves, position.mark, priors.tolist())
+      rewards[k] = value if position.mark == 1 else 1 - value
+    for k, path in enumerate(paths):
+      self.backpropagation(path, rewards[k])
+    return len(paths)
+
+  def search(self, deadline, timer=None):
+    '''
+    Aim - Run select / expand / simulate / backpropagate iterations (or PUCT
+          steps of several leaves) until the time.perf_counter() deadline, or
+          until the timer stops the search. The clock is only read every few
+          iterations, and at least one iteration always runs.
+    '''
+    interval = max(CLOCK_INTERVAL // self.batch_rollouts, 1)
+    iterations = checked = 0
+    while True:
+      if self.network is not None:
+        iterations += self.evaluate_leaves()
       else:
-        reward = -10
-
-      node_id = child_node_id
-      self.tree[node_id]['total_node_visits'] += 1
-      self.tree[node_id]['total_node_wins'] += reward
-
-    def start_the_game(self):
-      '''
-      Aim - Complete MCTS iteration with all the process running for some fixed time
-      '''
-      self.initial_time = time.time()
-      is_expanded = False
-
-      while time.time() - self.initial_time < self.time_limit:
-        node_id = self.selection()
-        if not is_expanded:
-          node_id = self.expansion(node_id)
-          is_expanded = True
-        winner = self.simulation(node_id)
-        self.backpropagation(node_id, winner)
- 
-      current_state_node_id = (0,)
-      action_candidates = self.tree[current_state_node_id]['child']
-      total_visits = -math.inf
-      for action in action_candidates:
-        action = current_state_node_id + (action,)
-        visit = self.tree[action]['total_node_visits']
-        if visit > total_visits:
-          total_visits = visit
-          best_action = action
-      
-      return best_action
-
-  my_agent = MCTS(obs, config)
-
-  return my_agent.start_the_game()[1]
+        path, position = self.selection()
+        path = self.expansion(path, position)
+        reward = self.simulation(position)
+        self.backpropagation(path, reward)
+        iterations += 1
+      if iterations - checked >= interval:
+        checked = iterations
+        now = time.perf_counter()
+        if now >= deadline or (timer is not None and timer.stop(self, iterations, now)):
+          break
+    self.iterations = iterations
+
+  # Visits of each move from the root
+  def root_visits(self):
+    return {int(self.tree.move[node_id]): int(self.tree.visits[node_id]) for node_id in self.tree.children(self.root_node)}
+
+  def start_the_game(self):
+    '''
+    Aim - Search for as long as the timer allows, then play the most visited move
+    '''
+    self.timer.start(self.obs, self.config, self.config.rows*self.config.columns - self.board.count)
+    self.search(self.timer.limit, self.timer)
+    visits = self.root_visits()
+    return max(visits, key=visits.get)
+
+class MCTSAgent():
+  '''
+  MCTS player that keeps its tree from one turn to the next. On a new observation
+  it finds the opponent's reply to the move it played, re-roots the tree at that
+  grandchild of the old root (dropping every other branch) and keeps searching
+  from there. Options are passed on to MCTS.
+  '''
+
+  def __init__(self, **options):
+    self.options = options
+    self.mcts = None
+    self.move = None
+    # Visits of the root carried over on the last turn
+    self.reused_visits = 0
+
+  # Tree of the previous search re-rooted at the observed position, or None
+  def reuse(self, obs, config):
+    mcts = self.mcts
+    if mcts is None or mcts.player != obs.mark or (mcts.config.rows, mcts.config.columns, mcts.config.inarow) != \
+        (config.rows, config.columns, config.inarow):
+      return None
+    position = mcts.board.copy()
+    position.play(self.move)
+    observed = Board.from_board(obs.board, obs.mark, config)
+    opponent = 3 - obs.mark
+    reply = observed.boards[opponent] & ~position.boards[opponent]
+    if observed.boards[obs.mark] != position.boards[obs.mark] or reply & (reply-1) or \
+        position.boards[opponent] & ~observed.boards[opponent] or not reply:
+      return None
+    # Follow our move and the reply down the tree. A symmetric node only has one
+    # move of each mirror pair, so the path may continue in the mirror image.
+    tree, node_id, flipped = mcts.tree, mcts.root_node, False
+    position = mcts.board.copy()
+    for move in (self.move, (reply.bit_length()-1) // position.stride):
+      target = config.columns-1-move if flipped else move
+      child_id = tree.child(node_id, target)
+      if child_id is None and position.is_symmetric():
+        child_id = tree.child(node_id, config.columns-1-target)
+        flipped = not flipped
+      if child_id is None:
+        return None
+      position.play(move)
+      node_id = child_id
+    return tree.subtree(node_id, config.columns if flipped else None)
+
+  def __call__(self, obs, config):
+    tree = self.reuse(obs, config)
+    self.reused_visits = tree.visits[0] if tree is not None else 0
+    self.mcts = MCTS(obs, config, tree, **self.options)
+    self.move = self.mcts.start_the_game()
+    return self.move
+
+_WORKER = {}
+
+def _init_worker(lock):
+  _WORKER['lock'] = lock
+
+def _worker_search(board, mark, size, deadline, seed, options, tree_name=None, capacity=0):
+  # Every worker starts from the random state of the parent, so reseed them apart
+  random.seed(seed)
+  np.random.seed(seed % 2**32)
+  config = SimpleNamespace(rows=size[0], columns=size[1], inarow=size[2])
+  obs = SimpleNamespace(board=board, mark=mark)
+  tree = None
+  if tree_name is not None:
+    tree = SharedNodeStore(capacity, _WORKER['lock'], tree_name)
+    options = dict(options, virtual_loss=1)
+  mcts = MCTS(obs, config, tree, **options)
+  # The deadline is a time.time() value, the same clock in every process
+  mcts.search(time.perf_counter() + deadline - time.time())
+  visits = mcts.root_visits() if tree is None else None
+  if tree is not None:
+    tree.close()
+  return visits, mcts.rollouts
+
+class ParallelMCTSAgent():
+  '''
+  MCTS over a pool of worker processes, started on the first move and kept after.
+
+    "root" - every worker grows its own tree from the position, and the visits of
+             the root moves are added up at the deadline
+    "tree" - the workers grow one tree in shared memory (SharedNodeStore of
+             `capacity` nodes), spreading out with virtual loss
+
+  The tree is not kept between turns, and the workers search until the timer's
+  target time without stopping early. Options are passed on to MCTS.
+  '''
+
+  def __init__(self, workers, mode="root", capacity=1 << 20, timer=None, **options):
+    if mode not in ("root", "tree"):
+      raise ValueError("Unknown parallel MCTS mode: {}".format(mode))
+    self.workers = workers
+    self.mode = mode
+    self.capacity = capacity
+    self.timer = timer if timer is not None else TimeManager()
+    self.options = options
+    self.pool = None
+    # Rollouts of all the workers on the last move
+    self.rollouts = 0
+
+  def start(self):
+    # Forked workers must share this process' resource tracker: one of their own
+    # would free the shared tree when the worker exits
+    resource_tracker.ensure_running()
+    self.lock = multiprocessing.Lock()
+    self.pool = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(self.lock,))
+    for future in [self.pool.submit(time.sleep, 0.05) for _ in range(self.workers)]:
+      future.result()
+
+  def __call__(self, obs, config):
+    if self.pool is None:
+      self.start()
+    self.timer.start(obs, config, config.rows*config.columns - sum(1 for cell in obs.board if cell))
+    deadline = time.time() + self.timer.target - self.timer.started
+    size = (config.rows, config.columns, config.inarow)
+    board = list(obs.board)
+    tree = None
+    if self.mode == "tree":
+      tree = SharedNodeStore(self.capacity, self.lock)
+      tree.add(-1, -1, 3 - obs.mark)
+    try:
+      seeds = [random.getrandbits(62) for _ in range(self.workers)]
+      futures = [self.pool.submit(_worker_search, board, obs.mark, size, deadline, seed, self.options,
+                                  tree.name if tree is not None else None, self.capacity) for seed in seeds]
+      visits = {}
+      self.rollouts = 0
+      for future in futures:
+        worker_visits, rollouts = future.result()
+        self.rollouts += rollouts
+        for move, count in (worker_visits or {}).items():
+          visits[move] = visits.get(move, 0) + count
+      if tree is not None:
+        visits = MCTS(obs, config, tree).root_visits()
+    finally:
+      if tree is not None:
+        tree.close()
+    return max(visits, key=visits.get)
+
+my_agent = MCTSAgent()
+
+def connectx_agent(obs, config):
+
+  return my_agent(obs, config)
@@ -0,0 +1,209 @@
+"""
+Parallel alpha-beta for the minimax agents: root splitting and lazy SMP.
+
+A RootPool keeps a concurrent.futures process pool alive for as long as the agent
+runs. Its workers are started (and have imported NumPy and the engine) before the
+first move is searched, and keep their transposition tables between tasks. Each
+task searches one root move to a given depth.
+
+The root moves share a cutoff bound: the best root score found so far lives in
+shared memory, and a worker reads it again before every reply it searches, so a
+root move stops as soon as it cannot beat a move finished by another worker. As in
+the single-process search, moves tying for best get their exact score and the
+others an upper bound below it.
+
+An SMPPool runs lazy SMP instead: this process runs the usual iterative deepening
+while every worker searches the same root at the same time, starting one ply deeper
+every other worker and trying the root moves in a rotated order. Nothing is split
+or synchronised; all of them read and write one SharedTranspositionTable, so the
+main search keeps finding results the helpers stored ahead of it and gets deeper in
+the same time. Only the main search's scores are used.
+"""
+
+import atexit
+import math
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker
+from types import SimpleNamespace
+from bitboard import Position
+from search import Search, SearchStats, SearchTimeout, iterative_deepening
+from transposition import SharedTranspositionTable, TableStore
+from windows import IncrementalWindows
+
+_WORKER = {}
+
+def _init_worker(terms, evaluator, bound):
+    # Imported here so the pool can be created from engine.py
+    from engine import Engine
+    _WORKER['engine'] = Engine(terms, evaluator=evaluator, book=None, endgame=0)
+    _WORKER['tables'] = TableStore(size=1 << 16, replacement="depth", persist=True)
+    _WORKER['bound'] = bound
+    _WORKER['shared'] = {}
+
+def _warm_up(delay):
+    # Keeps the worker busy long enough for the pool to start all of them
+    time.sleep(delay)
+
+# Score of root move col searched `depth` plies deep, or None if the deadline (a
+# time.time() value, the same clock in every process, or None) passed first.
+# Returns (score, nodes).
+def _score_root_move(board, mark, size, col, depth, deadline):
+    engine, bound = _WORKER['engine'], _WORKER['bound']
+    config = SimpleNamespace(rows=size[0], columns=size[1], inarow=size[2])
+    position = Position.from_board(board, mark, config)
+    table = _WORKER['tables'].get(position)
+    evaluate = engine.evaluate(mark, config)
+    evaluate_children = engine.evaluate_children(mark, config) if engine.evaluator == "batch" else None
+    stats = SearchStats()
+    search = Search(evaluate, config.columns, table, stats, evaluate_children)
+    if deadline is not None:
+        search.deadline = time.perf_counter() + deadline - time.time()
+    position.play(col)
+    if engine.evaluator == "incremental":
+        IncrementalWindows(position)
+    try:
+        if depth == 1 or position.is_terminal():
+            value = search.alphabeta(position, depth-1, -math.inf, -(bound.value-1), 1)
+        else:
+            # The opponent's replies, with the shared bound read before each one
+            stats.nodes += 1
+            value = -math.inf
+            for reply in search.ordering.order(position.valid_moves(), 1, position.mark):
+                beta = -(bound.value-1)
+                if value >= beta:
+                    stats.cutoffs += 1
+                    break
+                position.play(reply)
+                value = max(value, -search.alphabeta(position, depth-2, -beta, -value, 2))
+                position.undo()
+    except SearchTimeout:
+        return None, stats.nodes
+    score = -value
+    with bound.get_lock():
+        if score > bound.value:
+            bound.value = score
+    return score, stats.nodes
+
+# Lazy SMP helper: iterative deepening on the root, with the root moves rotated by
+# `offset` and odd offsets starting one ply deeper, until the deadline or max_depth.
+# The search only matters for what it leaves in the shared table. Returns the nodes searched.
+def _helper_search(board, mark, size, moves, table_name, table_size, generation, deadline, max_depth, offset):
+    engine = _WORKER['engine']
+    shared = _WORKER['shared']
+    if table_name not in shared:
+        shared[table_name] = SharedTranspositionTable(table_size, name=table_name)
+    table = shared[table_name]
+    table.generation = generation
+    config = SimpleNamespace(rows=size[0], columns=size[1], inarow=size[2])
+    position = Position.from_board(board, mark, config)
+    evaluate = engine.evaluate(mark, config)
+    evaluate_children = engine.evaluate_children(mark, config) if engine.evaluator == "batch" else None
+    if engine.evaluator == "incremental":
+        IncrementalWindows(position)
+    stats = SearchStats()
+    search = Search(evaluate, config.columns, table, stats, evaluate_children)
+    search.deadline = time.perf_counter() + deadline - time.time()
+    order = search.ordering.order(moves, 0, mark)
+    try:
+        for depth in range(1 + offset%2, max_depth+1):
+            shift = offset % len(order)
+            scores = search.score_moves(position, depth, order[shift:] + order[:shift])
+            order = sorted(scores, key=lambda col: -scores[col])
+    except SearchTimeout:
+        pass
+    return stats.nodes
+
+class RootPool:
+
+    def __init__(self, workers, terms, evaluator="batch"):
+        self.workers = workers
+        # Best root score of the depth being searched, shared by the workers
+        self.bound = multiprocessing.Value('d', -math.inf)
+        self.executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(terms, evaluator, self.bound))
+        for future in [self.executor.submit(_warm_up, 0.05) for _ in range(workers)]:
+            future.result()
+
+    # Scores of the root moves in `order` searched `depth` plies deep, or None if the
+    # deadline (a time.time() value) passed first
+    def score_moves(self, position, depth, order, deadline=None, stats=None):
+        self.bound.value = -math.inf
+        board = position.cells.tolist()
+        size = (position.rows, position.columns, position.inarow)
+        futures = {col: self.executor.submit(_score_root_move, board, position.mark, size, col, depth, deadline)
+                   for col in order}
+        scores = {}
+        for col, future in futures.items():
+            scores[col], nodes = future.result()
+            if stats is not None:
+                stats.nodes += nodes
+        if None in scores.values():
+            return None
+        return scores
+
+    # Iterative deepening over the pool: scores of the deepest search that finished
+    # within `budget` seconds (depth 1 always finishes)
+    def iterative_deepening(self, position, budget, moves=None, max_depth=None, stats=None):
+        deadline = time.time() + budget
+        moves = position.valid_moves() if moves is None else moves
+        empties = position.rows*position.columns - position.count
+        max_depth = empties if max_depth is None else min(max_depth, empties)
+        center = (position.columns-1) / 2
+        order = sorted(moves, key=lambda c: abs(c-center))
+        scores = self.score_moves(position, 1, order, stats=stats)
+        if stats is not None:
+            stats.depth = 1
+        for depth in range(2, max_depth+1):
+            if time.time() > deadline:
+                break
+            order = sorted(scores, key=lambda col: -scores[col])
+            result = self.score_moves(position, depth, order, deadline, stats)
+            if result is None:
+                break
+            scores = result
+            if stats is not None:
+                stats.depth = depth
+        return scores
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+class SMPPool(RootPool):
+
+    def __init__(self, workers, terms, evaluator="batch", table_size=1 << 18):
+        # Forked workers must share this process' resource tracker: one of their own
+        # would free the shared tables when the worker exits
+        resource_tracker.ensure_running()
+        super().__init__(workers, terms, evaluator)
+        # One shared table per mark, kept between the turns of a game
+        self.tables = TableStore(size=table_size, replacement="depth", persist=True,
+                                 table_class=SharedTranspositionTable)
+        atexit.register(self.shutdown)
+
+    # Iterative deepening in this process with the workers as helpers: scores of the
+    # deepest search that finished within `budget` seconds
+    def iterative_deepening(self, position, budget, evaluate, evaluate_children=None, moves=None, max_depth=None,
+                            stats=None):
+        table = self.tables.get(position)
+        moves = position.valid_moves() if moves is None else moves
+        empties = position.rows*position.columns - position.count
+        max_depth = empties if max_depth is None else min(max_depth, empties)
+        board = position.cells.tolist()
+        size = (position.rows, position.columns, position.inarow)
+        deadline = time.time() + budget
+        helpers = [self.executor.submit(_helper_search, board, position.mark, size, moves, table.name,
+                                        table.size, table.generation, deadline, max_depth, offset)
+                   for offset in range(1, self.workers+1)]
+        scores = iterative_deepening(position, evaluate, budget, max_depth, table, stats, evaluate_children, moves)
+        for helper in helpers:
+            nodes = helper.result()
+            if stats is not None:
+                stats.nodes += nodes
+        return scores
+
+    def shutdown(self):
+        super().shutdown()
+        for table in self.tables.tables.values():
+            table.close()
+        self.tables.tables.clear()
@@ -0,0 +1,224 @@
+"""
+Alpha-beta search shared by the minimax agents.
+
+The search is written in negamax form: `evaluate(position)` must return the value of
+the position for the player to move. Wrapping a heuristic that scores the board for
+one fixed mark is enough (negate it when the other player is to move), and gives the
+same values as the agents' full-width minimax.
+
+iterative_deepening() searches depth 1, 2, 3, ... until a time budget is spent and
+returns the scores of the last depth that finished.
+
+An optional `evaluate_children(position, moves)` returns, in one call, the values of
+the positions after each of `moves` for the player to move in `position`. When given,
+nodes one ply above the leaves evaluate all their children together instead of one
+leaf at a time (no pruning happens among those children, the value is the same).
+"""
+
+import math
+import time
+from transposition import EXACT, LOWER, UPPER
+
+# Counters for one search, to check how much alpha-beta is pruning
+class SearchStats:
+
+    def __init__(self):
+        self.nodes = 0
+        self.leaves = 0
+        self.cutoffs = 0
+        self.table_hits = 0
+        # Deepest iteration completed by iterative deepening
+        self.depth = 0
+
+    # Fraction of the interior nodes that were cut off
+    def cutoff_ratio(self):
+        interior = self.nodes - self.leaves
+        return self.cutoffs / interior if interior else 0.0
+
+    def __repr__(self):
+        return 'SearchStats(depth={}, nodes={}, leaves={}, cutoffs={}, table_hits={}, cutoff_ratio={:.2f})'.format(
+            self.depth, self.nodes, self.leaves, self.cutoffs, self.table_hits, self.cutoff_ratio())
+
+# Orders moves center-first, then by killer moves and history scores
+class MoveOrdering:
+
+    def __init__(self, columns):
+        center = (columns-1) / 2
+        # Columns sorted from the center outwards
+        self.center_order = sorted(range(columns), key=lambda c: abs(c-center))
+        # Two most recent moves that caused a cutoff, per ply
+        self.killers = []
+        # Depth-weighted cutoff counts per mark and column
+        self.history = [[0]*columns for _ in range(3)]
+
+    def order(self, moves, ply, mark, hint=None):
+        while len(self.killers) <= ply:
+            self.killers.append([None, None])
+        killers = self.killers[ply]
+        history = self.history[mark]
+        def priority(col):
+            if col == hint:
+                return 0
+            if col in killers:
+                return 1
+            return 2
+        moves = [c for c in self.center_order if c in moves]
+        # sort() is stable, so equal priority and history keeps center-first order
+        moves.sort(key=lambda c: (priority(c), -history[c]))
+        return moves
+
+    def record_cutoff(self, col, ply, mark, depth):
+        killers = self.killers[ply]
+        if killers[0] != col:
+            killers[1] = killers[0]
+            killers[0] = col
+        self.history[mark][col] += depth*depth
+
+# Raised inside the search when the deadline has passed
+class SearchTimeout(Exception):
+    pass
+
+# Nodes searched between two looks at the clock
+CLOCK_INTERVAL = 64
+
+class Search:
+
+    def __init__(self, evaluate, columns, table=None, stats=None, evaluate_children=None):
+        self.evaluate = evaluate
+        self.evaluate_children = evaluate_children
+        self.ordering = MoveOrdering(columns)
+        # Optional TranspositionTable, shared by every root move
+        self.table = table
+        self.stats = stats if stats is not None else SearchStats()
+        # time.perf_counter() value after which the search gives up, or None
+        self.deadline = None
+
+    # Negamax with alpha-beta pruning, returns the value for the player to move
+    def alphabeta(self, position, depth, alpha, beta, ply):
+        stats = self.stats
+        stats.nodes += 1
+        if self.deadline is not None and stats.nodes % CLOCK_INTERVAL == 0 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        hint = None
+        if self.table is not None:
+            # Mirror images share an entry; its move is stored in the canonical orientation
+            key, mirrored = position.canonical_hash()
+            entry = self.table.probe(key)
+            if entry is not None:
+                entry_depth, value, flag, hint = entry
+                if mirrored and hint is not None:
+                    hint = position.mirror_move(hint)
+                if entry_depth >= depth:
+                    if flag == EXACT:
+                        stats.table_hits += 1
+                        return value
+                    if flag == LOWER:
+                        alpha = max(alpha, value)
+                    else:
+                        beta = min(beta, value)
+                    if alpha >= beta:
+                        stats.table_hits += 1
+                        return value
+        if depth == 0 or position.is_terminal():
+            stats.leaves += 1
+            value = self.evaluate(position)
+            if self.table is not None:
+                self.table.store(key, depth, value, EXACT, None)
+            return value
+        alpha_start = alpha
+        mark = position.mark
+        moves = self.ordering.order(position.valid_moves(), ply, mark, hint)
+        if depth == 1 and self.evaluate_children is not None:
+            # Score the whole frontier at once
+            scores = self.evaluate_children(position, moves)
+            stats.nodes += len(moves)
+            stats.leaves += len(moves)
+            best = max(range(len(moves)), key=lambda i: scores[i])
+            value, best_move = scores[best], moves[best]
+            if value >= beta:
+                stats.cutoffs += 1
+                self.ordering.record_cutoff(best_move, ply, mark, depth)
+        else:
+            value = -math.inf
+            best_move = None
+            for col in moves:
+                position.play(col)
+                score = -self.alphabeta(position, depth-1, -beta, -alpha, ply+1)
+                position.undo()
+                if score > value:
+                    value = score
+                    best_move = col
+                if value > alpha:
+                    alpha = value
+                if alpha >= beta:
+                    stats.cutoffs += 1
+                    self.ordering.record_cutoff(col, ply, mark, depth)
+                    break
+        if self.table is not None:
+            if value <= alpha_start:
+                flag = UPPER
+            elif value >= beta:
+                flag = LOWER
+            else:
+                flag = EXACT
+            if mirrored:
+                best_move = position.mirror_move(best_move)
+            self.table.store(key, depth, value, flag, best_move)
+        return value
+
+    # Scores every root move. Moves tying for best get their exact score; every
+    # other move gets an upper bound that is strictly below the best score.
+    # `order` fixes the order of the root moves, e.g. best first from a shallower search.
+    def score_moves(self, position, depth, order=None):
+        self.stats.nodes += 1
+        if order is None:
+            order = self.ordering.order(position.valid_moves(), 0, position.mark)
+        scores = {}
+        best = -math.inf
+        for col in order:
+            position.play(col)
+            # Searching with alpha just below the best keeps ties exact (scores are integers)
+            score = -self.alphabeta(position, depth-1, -math.inf, -(best-1), 1)
+            position.undo()
+            scores[col] = score
+            best = max(best, score)
+        return scores
+
+# Scores the root moves of `position` (all of them, or `moves`) with a `depth` ply alpha-beta search
+def score_moves(position, depth, evaluate, table=None, stats=None, evaluate_children=None, moves=None):
+    search = Search(evaluate, position.columns, table, stats, evaluate_children)
+    order = None if moves is None else search.ordering.order(moves, 0, position.mark)
+    return search.score_moves(position, depth, order)
+
+# Per-move time limit in seconds from the Kaggle configuration
+def move_time(config):
+    return getattr(config, 'actTimeout', None) or getattr(config, 'timeout', None) or 2
+
+# Iterative deepening: scores the root moves at depth 1, 2, 3, ... until `budget`
+# seconds have passed and returns the scores of the deepest search that finished.
+# Depth 1 always runs to completion. Each iteration searches the previous best moves
+# first, and the transposition table (if any) carries the principal variation down.
+# Only `moves` are searched at the root when given.
+def iterative_deepening(position, evaluate, budget, max_depth=None, table=None, stats=None, evaluate_children=None, moves=None):
+    deadline = time.perf_counter() + budget
+    search = Search(evaluate, position.columns, table, stats, evaluate_children)
+    empties = position.rows*position.columns - position.count
+    max_depth = empties if max_depth is None else min(max_depth, empties)
+    played = len(position.moves)
+    order = None if moves is None else search.ordering.order(moves, 0, position.mark)
+    scores = search.score_moves(position, 1, order)
+    search.stats.depth = 1
+    search.deadline = deadline
+    for depth in range(2, max_depth+1):
+        if time.perf_counter() > deadline:
+            break
+        order = sorted(scores, key=lambda col: -scores[col])
+        try:
+            scores = search.score_moves(position, depth, order)
+        except SearchTimeout:
+            # Take back the moves of the search that was cut short
+            while len(position.moves) > played:
+                position.undo()
+            break
+        search.stats.depth = depth
+    return scores
@@ -0,0 +1,155 @@
+"""
+Exact endgame solver for the minimax agents.
+
+Negamax with alpha-beta pruning over the bitboard Position, with a transposition
+table of upper bounds and a null-window search on top: solve() narrows the
+[min, max] score range with zero-width searches, which prune far more than one
+wide search. Only moves that do not lose at once are searched (a forced block is
+the only move, and a column whose next cell would let the opponent win on top is
+skipped), and they are tried in the order of the winning cells they create.
+
+Scores count how soon the game ends, for the player to move:
+
+    0            the game is drawn
+    positive     the player to move wins; (cells + 1 - discs) // 2 where `discs`
+                 is the number of discs on the board before the winning move, so
+                 a faster win scores higher
+    negative     the opponent wins, with the same scale
+
+where `cells` is rows*columns. distance() turns a score back into moves.
+"""
+
+import time
+from search import CLOCK_INTERVAL, SearchTimeout
+from tactics import line_cells
+from transposition import UPPER, TranspositionTable
+
+def _popcount(bits):
+    return bin(bits).count('1')
+
+class Solver:
+
+    def __init__(self, config, table_size=1 << 18):
+        self.cells = config.rows * config.columns
+        center = (config.columns-1) / 2
+        # Columns sorted from the center outwards
+        self.center_order = sorted(range(config.columns), key=lambda c: abs(c-center))
+        # Upper bounds of the positions searched so far. Scores only depend on the
+        # position, so the table stays valid between searches.
+        self.table = TranspositionTable(table_size, replacement="always")
+        self.nodes = 0
+        # time.perf_counter() value after which the solver gives up, or None
+        self.deadline = None
+
+    # Number of moves (of both players) until the game ends with perfect play from a
+    # position with `discs` discs and the given score, None for a draw
+    def distance(self, score, discs):
+        if score == 0:
+            return None
+        # Discs on the board before the winning move, which the winner plays
+        winning = self.cells+1 - 2*abs(score)
+        if (winning-discs) % 2 != (score < 0):
+            winning -= 1
+        return winning - discs + 1
+
+    # Cells where the next disc of each column lands
+    def _playable(self, position):
+        return ((position.boards[1] | position.boards[2]) + position.bottom_mask) & position.board_mask
+
+    # Empty cells completing a line of `board`
+    def _threats(self, position, board, filled):
+        return line_cells(position, board) & position.board_mask & ~filled
+
+    # Negamax with alpha-beta over scores in (alpha, beta). The position must not be
+    # over already.
+    def negamax(self, position, alpha, beta):
+        self.nodes += 1
+        if self.deadline is not None and self.nodes % CLOCK_INTERVAL == 0 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        cells, count = self.cells, position.count
+        mark = position.mark
+        filled = position.boards[1] | position.boards[2]
+        playable = self._playable(position)
+        own = position.boards[mark]
+        if self._threats(position, own, filled) & playable:
+            return (cells+1-count) // 2
+        opp_threats = self._threats(position, position.boards[3-mark], filled)
+        forced = opp_threats & playable
+        if forced:
+            if forced & (forced-1):
+                # Two cells to block: the opponent wins next move
+                return -((cells-count) // 2)
+            playable = forced
+        # Never play right below a cell where the opponent would win
+        moves = playable & ~(opp_threats >> 1)
+        if not moves:
+            return -((cells-count) // 2)
+        if count >= cells-2:
+            return 0
+        # Neither side can win faster than this any more
+        low = -((cells-2-count) // 2)
+        if alpha < low:
+            alpha = low
+            if alpha >= beta:
+                return alpha
+        high = (cells-1-count) // 2
+        key = position.canonical_hash()[0]
+        entry = self.table.probe(key)
+        if entry is not None:
+            high = entry[1]
+        if beta > high:
+            beta = high
+            if alpha >= beta:
+                return beta
+        # Moves that create the most winning cells first, center first among equals
+        candidates = []
+        for col in self.center_order:
+            bit = 1 << position.top_index(col) if position.can_play(col) else 0
+            if moves & bit:
+                created = _popcount(self._threats(position, own | bit, filled | bit))
+                candidates.append((-created, len(candidates), col))
+        candidates.sort()
+        for _, _, col in candidates:
+            position.play(col)
+            score = -self.negamax(position, -beta, -alpha)
+            position.undo()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        self.table.store(key, 0, alpha, UPPER, None)
+        return alpha
+
+    # Exact score of the position for the player to move, which must not be over
+    def solve(self, position):
+        cells, count = self.cells, position.count
+        low, high = -((cells-count) // 2), (cells+1-count) // 2
+        while low < high:
+            # Null-window probes, biased towards 0 to find draws and short wins first
+            med = low + (high-low) // 2
+            if med <= 0 and int(low/2) < med:
+                med = int(low/2)
+            elif med >= 0 and int(high/2) > med:
+                med = int(high/2)
+            score = self.negamax(position, med, med+1)
+            if score <= med:
+                high = score
+            else:
+                low = score
+        return low
+
+    # Exact scores of the moves (all valid moves by default), for the player to move
+    def score_moves(self, position, moves=None):
+        moves = position.valid_moves() if moves is None else moves
+        scores = {}
+        for col in moves:
+            position.play(col)
+            if position.is_win(3 - position.mark):
+                score = (self.cells+1-(position.count-1)) // 2
+            elif position.is_full():
+                score = 0
+            else:
+                score = -self.solve(position)
+            position.undo()
+            scores[col] = score
+        return scores
@@ -0,0 +1,59 @@
+"""
+Tactical checks run on the root position before searching.
+
+Winning cells are found on the bitboard directly: a cell wins for a mark when the
+other inarow-1 cells of some line through it hold that mark's discs, which is a few
+shifts and ANDs per direction. From them the root move list is cut down to an
+immediate win, a forced block, or the moves that do not let the opponent win by
+playing on top of ours.
+"""
+
+# Bitmask of the cells (empty or not, sentinels included) that would complete a line
+# of the discs in bitboard
+def line_cells(position, board):
+    cells = 0
+    for shift in position.directions:
+        # The empty cell is the k-th cell of the line
+        for k in range(position.inarow):
+            run = -1
+            for j in range(-k, position.inarow-k):
+                if j > 0:
+                    run &= board >> (j*shift)
+                elif j < 0:
+                    run &= board << (-j*shift)
+            cells |= run
+    return cells
+
+# Bitmask of the empty cells that would complete a line for mark
+def winning_cells(position, mark):
+    cells = line_cells(position, position.boards[mark])
+    return cells & position.board_mask & ~(position.boards[1] | position.boards[2])
+
+# Bitmask of the cells where the next disc of each column lands
+def playable_cells(position):
+    cells = 0
+    for col in position.valid_moves():
+        cells |= 1 << position.top_index(col)
+    return cells
+
+# Root moves left after the tactical checks, and whether the choice is forced (any of
+# the returned moves can be played without searching):
+#   - columns that win at once (forced)
+#   - otherwise the columns blocking an immediate win of the opponent (forced if one)
+#   - otherwise the moves that do not give the opponent a winning cell right above,
+#     unless every move does
+def tactical_moves(position):
+    moves = position.valid_moves()
+    own_wins = winning_cells(position, position.mark)
+    opp_wins = winning_cells(position, 3 - position.mark)
+    wins = [col for col in moves if own_wins >> position.top_index(col) & 1]
+    if wins:
+        return wins, True
+    blocks = [col for col in moves if opp_wins >> position.top_index(col) & 1]
+    if blocks:
+        return blocks, len(blocks) == 1
+    safe = [col for col in moves
+            if position.heights[col]+1 >= position.rows or not opp_wins >> (position.top_index(col)+1) & 1]
+    if safe:
+        moves = safe
+    return moves, len(moves) == 1
@@ -0,0 +1,172 @@
+"""
+Bounded transposition table for the alpha-beta search, keyed by the canonical
+Zobrist hash (Position.canonical_hash), so a position and its mirror image share
+one entry.
+
+Entries live in fixed-size parallel lists indexed by the low bits of the hash, so
+memory stays constant however long the game runs. When two positions land in the
+same slot the replacement policy decides which one is kept:
+
+  "depth"  - keep the deeper entry, unless it is left over from an earlier search
+  "always" - the newest entry always wins
+
+SharedTranspositionTable keeps the same entries in a multiprocessing.shared_memory
+block so several processes can search with one table. It takes no locks: each slot
+holds the key XORed with the two data words, so an entry torn by two processes
+writing at once no longer matches its key and is simply missed.
+"""
+
+import struct
+from multiprocessing import shared_memory
+import numpy as np
+
+# Bound types of the stored values
+EXACT, LOWER, UPPER = 0, 1, 2
+
+class TranspositionTable:
+
+    def __init__(self, size=1 << 16, replacement="depth"):
+        if replacement not in ("depth", "always"):
+            raise ValueError("Unknown replacement policy: {}".format(replacement))
+        # Round the size down to a power of two so the slot is a bit mask of the hash
+        self.size = 1 << (max(1, size).bit_length() - 1)
+        self.replacement = replacement
+        self.clear()
+
+    def clear(self):
+        self.keys = [None] * self.size
+        self.depths = [0] * self.size
+        self.values = [0] * self.size
+        self.flags = [EXACT] * self.size
+        self.moves = [None] * self.size
+        self.generations = [0] * self.size
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+
+    # Marks the start of a new search, so entries from older searches can be replaced
+    def new_search(self):
+        self.generation += 1
+
+    # Returns (depth, value, flag, move) stored for the hash, or None
+    def probe(self, key):
+        self.probes += 1
+        slot = key & (self.size-1)
+        if self.keys[slot] != key:
+            return None
+        self.hits += 1
+        return self.depths[slot], self.values[slot], self.flags[slot], self.moves[slot]
+
+    def store(self, key, depth, value, flag, move):
+        slot = key & (self.size-1)
+        if (self.replacement == "depth" and self.keys[slot] is not None and self.keys[slot] != key
+                and self.generations[slot] == self.generation and self.depths[slot] > depth):
+            return
+        self.keys[slot] = key
+        self.depths[slot] = depth
+        self.values[slot] = value
+        self.flags[slot] = flag
+        self.moves[slot] = move
+        self.generations[slot] = self.generation
+
+# Keeps one table per mark, optionally carried over between the turns of a game.
+# table_class is TranspositionTable or SharedTranspositionTable.
+class TableStore:
+
+    def __init__(self, size=1 << 16, replacement="depth", persist=True, table_class=None):
+        self.size = size
+        self.replacement = replacement
+        self.persist = persist
+        self.table_class = table_class if table_class is not None else TranspositionTable
+        self.tables = {}
+        self.counts = {}
+
+    # Table for a search from `position`, with position.mark to move at the root.
+    # It is cleared unless persisting, or when a new game has started (fewer discs).
+    def get(self, position):
+        mark = position.mark
+        table = self.tables.get(mark)
+        if table is None:
+            table = self.tables[mark] = self.table_class(self.size, self.replacement)
+        elif not self.persist or position.count < self.counts[mark]:
+            table.clear()
+        self.counts[mark] = position.count
+        table.new_search()
+        return table
+
+# Layout of the info word of a shared entry: depth, flag, move+1 (0 for none) and
+# generation, plus a bit that is set in every stored entry so an empty slot never matches
+_DEPTH_BITS, _FLAG_BITS, _MOVE_BITS, _GENERATION_BITS = 8, 2, 8, 16
+_FLAG_SHIFT = _DEPTH_BITS
+_MOVE_SHIFT = _FLAG_SHIFT + _FLAG_BITS
+_GENERATION_SHIFT = _MOVE_SHIFT + _MOVE_BITS
+_STORED = 1 << 63
+_VALUE = struct.Struct('<d')
+
+def _field(info, shift, bits):
+    return info >> shift & ((1 << bits) - 1)
+
+# Transposition table in shared memory, usable from every process that attaches to
+# it by name. Same methods as TranspositionTable; values come back as floats.
+class SharedTranspositionTable:
+
+    def __init__(self, size=1 << 16, replacement="depth", name=None):
+        if replacement not in ("depth", "always"):
+            raise ValueError("Unknown replacement policy: {}".format(replacement))
+        self.size = 1 << (max(1, size).bit_length() - 1)
+        self.replacement = replacement
+        # Words per slot: key ^ value ^ info, value (float64 bits), info
+        nbytes = self.size * 3 * 8
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=nbytes)
+            self.owner = True
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.name = self.memory.name
+        self.slots = np.ndarray((self.size, 3), dtype=np.uint64, buffer=self.memory.buf)
+        if self.owner:
+            self.slots[:] = 0
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+
+    def clear(self):
+        self.slots[:] = 0
+        self.probes = 0
+        self.hits = 0
+
+    def new_search(self):
+        self.generation += 1
+
+    # Returns (depth, value, flag, move) stored for the hash, or None
+    def probe(self, key):
+        self.probes += 1
+        check, value, info = (int(word) for word in self.slots[key & (self.size-1)])
+        if not info & _STORED or check ^ value ^ info != key:
+            return None
+        self.hits += 1
+        move = _field(info, _MOVE_SHIFT, _MOVE_BITS) - 1
+        return (_field(info, 0, _DEPTH_BITS), _VALUE.unpack(value.to_bytes(8, 'little'))[0],
+                _field(info, _FLAG_SHIFT, _FLAG_BITS), None if move < 0 else move)
+
+    def store(self, key, depth, value, flag, move):
+        slot = self.slots[key & (self.size-1)]
+        generation = self.generation & ((1 << _GENERATION_BITS) - 1)
+        if self.replacement == "depth":
+            check, old_value, old_info = (int(word) for word in slot)
+            if (old_info & _STORED and check ^ old_value ^ old_info != key
+                    and _field(old_info, _GENERATION_SHIFT, _GENERATION_BITS) == generation
+                    and _field(old_info, 0, _DEPTH_BITS) > depth):
+                return
+        value = int.from_bytes(_VALUE.pack(value), 'little')
+        info = (_STORED | min(depth, (1 << _DEPTH_BITS) - 1) | flag << _FLAG_SHIFT
+                | (0 if move is None else move+1) << _MOVE_SHIFT | generation << _GENERATION_SHIFT)
+        slot[:] = (key ^ value ^ info, value, info)
+
+    # Detaches from the shared block, and frees it when this table created it
+    def close(self):
+        del self.slots
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
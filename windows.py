@@ -0,0 +1,222 @@
+"""
+Vectorized window counting for the heuristics.
+
+A window is a line of config.inarow cells (horizontal, vertical or diagonal). The
+flat cell indices of every window are built once per board configuration, so the
+piece and empty counts of all windows come out of a single NumPy gather and sum
+instead of slicing each window into a Python list.
+
+WindowStats also takes a stack of boards, (N, rows, columns) or (N, rows*columns),
+in which case every count below has a leading axis of N, so a heuristic written
+with them scores a whole batch of boards in one call.
+"""
+
+import numpy as np
+
+# Check every good-spot set against scan_spots() (slow, for debugging only)
+DEBUG = False
+
+_TABLES = {}
+
+# Flat cell indices (num_windows x inarow) of every window, and a (num_windows x cells)
+# matrix telling which cells each window covers. Built once per configuration.
+def window_table(config):
+    key = (config.rows, config.columns, config.inarow)
+    if key not in _TABLES:
+        rows, columns, inarow = key
+        windows = []
+        # horizontal
+        for row in range(rows):
+            for col in range(columns-(inarow-1)):
+                windows.append([row*columns + col+i for i in range(inarow)])
+        # vertical
+        for row in range(rows-(inarow-1)):
+            for col in range(columns):
+                windows.append([(row+i)*columns + col for i in range(inarow)])
+        # positive diagonal
+        for row in range(rows-(inarow-1)):
+            for col in range(columns-(inarow-1)):
+                windows.append([(row+i)*columns + col+i for i in range(inarow)])
+        # negative diagonal
+        for row in range(inarow-1, rows):
+            for col in range(columns-(inarow-1)):
+                windows.append([(row-i)*columns + col+i for i in range(inarow)])
+        table = np.array(windows, dtype=np.intp).reshape(-1, inarow)
+        cover = np.zeros((len(table), rows*columns), dtype=bool)
+        cover[np.arange(len(table))[:, None], table] = True
+        _TABLES[key] = (table, cover)
+    return _TABLES[key]
+
+# Reference implementation of the good spots: plain scan over every window, returning
+# the set of (row, col) empty cells of the windows with num_discs discs of piece and
+# nothing else
+def scan_spots(grid, num_discs, piece, config):
+    grid = np.asarray(grid).reshape(config.rows, config.columns)
+    table, _ = window_table(config)
+    good_spots = set()
+    for window in table.tolist():
+        values = [grid[divmod(cell, config.columns)] for cell in window]
+        if values.count(piece) == num_discs and values.count(0) == config.inarow-num_discs:
+            good_spots.update(divmod(cell, config.columns) for cell, value in zip(window, values) if value == 0)
+    return good_spots
+
+# Set of (row, col) good spots of grid, same cells as scan_spots()
+def find_spots(grid, num_discs, piece, config):
+    spots = WindowStats(grid, config).spots(num_discs, piece)
+    return {divmod(int(cell), config.columns) for cell in np.flatnonzero(spots)}
+
+def _validate_spots(found, grid, num_discs, piece, config):
+    expected = scan_spots(grid, num_discs, piece, config)
+    if found != expected:
+        raise AssertionError("Good spots {} differ from the window scan {} (num_discs={}, piece={})".format(
+            sorted(found), sorted(expected), num_discs, piece))
+
+# Piece and empty counts of every window of one board, or of a stack of boards
+class WindowStats:
+
+    def __init__(self, grid, config):
+        self.config = config
+        self.table, self.cover = window_table(config)
+        cells = np.asarray(grid)
+        if cells.shape[-2:] == (config.rows, config.columns):
+            cells = cells.reshape(cells.shape[:-2] + (config.rows*config.columns,))
+        self.cells = cells
+        windows = cells[..., self.table]
+        self.empty = (windows == 0).sum(axis=-1)
+        self.pieces = [None, (windows == 1).sum(axis=-1), (windows == 2).sum(axis=-1)]
+
+    # Mask of the windows holding num_discs discs of piece and nothing else
+    def matches(self, num_discs, piece):
+        return (self.pieces[piece] == num_discs) & (self.empty == self.config.inarow-num_discs)
+
+    # Number of windows holding num_discs discs of piece and nothing else
+    def count(self, num_discs, piece):
+        return np.count_nonzero(self.matches(num_discs, piece), axis=-1)
+
+    # Mask of the empty cells ("good spots") lying in such windows
+    def spots(self, num_discs, piece):
+        spots = (self.matches(num_discs, piece) @ self.cover) & (self.cells == 0)
+        if DEBUG:
+            for board, mask in zip(self.cells.reshape(-1, spots.shape[-1]), spots.reshape(-1, spots.shape[-1])):
+                found = {divmod(int(cell), self.config.columns) for cell in np.flatnonzero(mask)}
+                _validate_spots(found, board, num_discs, piece, self.config)
+        return spots
+
+    # Number of good spots lying directly on top of another good spot
+    def stacked(self, spots):
+        spots = spots.reshape(spots.shape[:-1] + (self.config.rows, self.config.columns))
+        return np.count_nonzero(spots[..., 1:, :] & spots[..., :-1, :], axis=(-2, -1))
+
+    # Number of good spots in a mask from spots()
+    def size(self, spots):
+        return np.count_nonzero(spots, axis=-1)
+
+def _popcount(bits):
+    return bin(bits).count('1')
+
+# Window counts of a Position kept up to date move by move. A disc only changes the
+# windows through its cell, so play/undo update those and the heuristic reads its
+# counts and good spots directly. Offers the same methods as WindowStats; good
+# spots are bitmasks in the Position's bit layout (vertical neighbours are adjacent
+# bits). Attaching it to a position makes Position.play/undo keep it in sync.
+class IncrementalWindows:
+
+    def __init__(self, position):
+        self.position = position
+        self.inarow = position.inarow
+        # A Position carries the rows/columns/inarow of its configuration
+        table, _ = window_table(position)
+        # Bit index in the Position layout of every flat cell index
+        bit_of = [(c % position.columns)*position.stride + (position.rows-1 - c // position.columns)
+                  for c in range(position.rows*position.columns)]
+        self.window_bits = [[bit_of[c] for c in window] for window in table.tolist()]
+        # (row, col) of every bit index, for debugging
+        self.cell_of = {bit: divmod(c, position.columns) for c, bit in enumerate(bit_of)}
+        self.windows_of = [[] for _ in range(position.columns*position.stride)]
+        for w, bits in enumerate(self.window_bits):
+            for bit in bits:
+                self.windows_of[bit].append(w)
+        num_windows = len(self.window_bits)
+        num_bits = len(self.windows_of)
+        # Discs of each mark in every window
+        self.pieces = [None, [0]*num_windows, [0]*num_windows]
+        # Windows holding num discs of a mark and nothing else, per mark and num
+        self.counts = [None] + [[0]*(self.inarow+1) for _ in range(2)]
+        # Number of such windows covering each cell, per mark and num
+        self.cover = [None] + [[[0]*num_bits for _ in range(self.inarow+1)] for _ in range(2)]
+        # Empty cells covered by at least one such window, per mark and num
+        self.spot_bits = [None] + [[0]*(self.inarow+1) for _ in range(2)]
+        self.filled = 0
+        # Every window starts empty, so it holds 0 discs of both marks
+        for w in range(num_windows):
+            self._match(w, 1, 0, 1)
+            self._match(w, 2, 0, 1)
+        for mark in (1, 2):
+            bits = position.boards[mark]
+            while bits:
+                low = bits & -bits
+                self.place(low.bit_length()-1, mark)
+                bits ^= low
+        position.windows = self
+
+    # Adds (delta=1) or removes (delta=-1) window w from the windows holding
+    # num discs of mark and nothing else
+    def _match(self, w, mark, num, delta):
+        self.counts[mark][num] += delta
+        cover = self.cover[mark][num]
+        for bit in self.window_bits[w]:
+            cover[bit] += delta
+            if not self.filled >> bit & 1:
+                if delta > 0 and cover[bit] == 1:
+                    self.spot_bits[mark][num] |= 1 << bit
+                elif delta < 0 and cover[bit] == 0:
+                    self.spot_bits[mark][num] &= ~(1 << bit)
+
+    def place(self, bit, mark):
+        other = 3 - mark
+        self.filled |= 1 << bit
+        for spots in (self.spot_bits[1], self.spot_bits[2]):
+            for num in range(self.inarow+1):
+                spots[num] &= ~(1 << bit)
+        pieces, pieces_other = self.pieces[mark], self.pieces[other]
+        for w in self.windows_of[bit]:
+            num, num_other = pieces[w], pieces_other[w]
+            if num_other == 0:
+                self._match(w, mark, num, -1)
+                self._match(w, mark, num+1, 1)
+            if num == 0:
+                self._match(w, other, num_other, -1)
+            pieces[w] = num+1
+
+    def remove(self, bit, mark):
+        other = 3 - mark
+        pieces, pieces_other = self.pieces[mark], self.pieces[other]
+        for w in self.windows_of[bit]:
+            num, num_other = pieces[w]-1, pieces_other[w]
+            pieces[w] = num
+            if num_other == 0:
+                self._match(w, mark, num+1, -1)
+                self._match(w, mark, num, 1)
+            if num == 0:
+                self._match(w, other, num_other, 1)
+        self.filled &= ~(1 << bit)
+        for m in (1, 2):
+            for num in range(self.inarow+1):
+                if self.cover[m][num][bit]:
+                    self.spot_bits[m][num] |= 1 << bit
+
+    def count(self, num_discs, piece):
+        return self.counts[piece][num_discs]
+
+    def spots(self, num_discs, piece):
+        spots = self.spot_bits[piece][num_discs]
+        if DEBUG:
+            found = {cell for bit, cell in self.cell_of.items() if spots >> bit & 1}
+            _validate_spots(found, self.position.cells, num_discs, piece, self.position)
+        return spots
+
+    def size(self, spots):
+        return _popcount(spots)
+
+    def stacked(self, spots):
+        return _popcount(spots & (spots >> 1))